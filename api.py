@@ -0,0 +1,149 @@
+import json
+import threading
+from datetime import datetime, timezone
+
+from flask import Blueprint, current_app, jsonify, request, session
+
+import database as db
+from cart import get_cart, cart_items
+from open_orders import open_orders
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+# Serialized /api/menu body for the current menu version
+_menu_body = (None, b'')
+_menu_body_lock = threading.Lock()
+
+def _error(message, status=400):
+    return jsonify(error=message), status
+
+def _menu_json(menu):
+    """JSON body for a menu snapshot, serialized once per version"""
+    global _menu_body
+    fingerprint, body = _menu_body
+    if fingerprint != menu.fingerprint:
+        with _menu_body_lock:
+            body = json.dumps({
+                'version': menu.fingerprint,
+                'categories': menu.by_category,
+            }, separators=(',', ':')).encode()
+            _menu_body = (menu.fingerprint, body)
+    return body
+
+def _cart_json(cart):
+    lines, total = db.price_cart(cart_items(cart))
+    return {'items': lines, 'total': round(total, 2), 'count': len(cart)}
+
+@bp.route('/menu')
+def menu():
+    """In-stock menu grouped by category; supports If-None-Match / If-Modified-Since"""
+    menu = db.get_available_menu()
+    response = current_app.response_class(_menu_json(menu), mimetype='application/json')
+    response.set_etag(menu.fingerprint)
+    response.last_modified = datetime.fromtimestamp(int(menu.loaded_at), timezone.utc)
+    # Let kiosks keep a copy but revalidate it on every poll
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@bp.route('/cart', methods=['GET', 'POST'])
+def cart():
+    """Read or change the session cart
+
+    POST {"coffee_type_id": 3, "quantity": 2} sets one line (0 removes it);
+    POST {"items": {"3": 2, "7": 1}} replaces the whole cart.
+    """
+    if request.method == 'GET':
+        return jsonify(_cart_json(get_cart()))
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return _error('Expected a JSON object')
+
+    try:
+        if 'items' in data:
+            changes = {int(k): int(v) for k, v in dict(data['items']).items()}
+            cart = {}
+        else:
+            changes = {int(data['coffee_type_id']): int(data['quantity'])}
+            cart = get_cart()
+    except (KeyError, TypeError, ValueError):
+        return _error('Expected coffee_type_id and quantity, or an items map')
+
+    menu = db.get_menu()
+    for coffee_type_id, quantity in changes.items():
+        if coffee_type_id not in menu.by_id:
+            return _error(f'Invalid coffee type ID: {coffee_type_id}')
+        stock = db.get_stock(coffee_type_id)
+        if stock is not None and quantity > stock:
+            name = menu.by_id[coffee_type_id]['name']
+            return _error(f"Only {stock} of {name} left" if stock > 0 else f"{name} is sold out", 409)
+        if quantity > 0:
+            cart[str(coffee_type_id)] = quantity
+        else:
+            cart.pop(str(coffee_type_id), None)
+
+    session['cart'] = cart
+    return jsonify(_cart_json(cart))
+
+@bp.route('/checkout', methods=['POST'])
+def checkout():
+    """Place an order for the session cart: {"customer_name": "..."}
+
+    Send an Idempotency-Key header to make retries safe: a repeat with the
+    same key returns the order it placed (200, Idempotent-Replayed: true).
+    """
+    key = request.headers.get('Idempotency-Key')
+    if key and len(key) > db.MAX_IDEMPOTENCY_KEY_LENGTH:
+        return _error('Idempotency-Key is too long')
+    order_id = db.get_idempotent_order(key) if key else None
+    details = db.get_order_details(order_id) if order_id is not None else None
+    if details is not None:
+        response = jsonify(details)
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    data = request.get_json(silent=True) or {}
+    customer_name = str(data.get('customer_name', '')).strip()
+    if not customer_name:
+        return _error('customer_name is required')
+
+    cart = get_cart()
+    if not cart:
+        return _error('Cart is empty')
+
+    try:
+        order_id = db.place_order(customer_name, cart_items(cart), key)
+    except db.OutOfStock as e:
+        return _error(str(e), 409)
+    except ValueError as e:
+        return _error(str(e))
+
+    session.pop('cart', None)
+    return jsonify(db.get_order_details(order_id)), 201
+
+@bp.route('/orders/search')
+def search_orders():
+    """Orders matching ?q= by customer or item name, best first"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return _error('q is required')
+    results, corrected = db.search_orders(query)
+    return jsonify(orders=results, corrected=corrected)
+
+@bp.route('/orders/open')
+def open_tickets():
+    """Orders still in the barista workflow, oldest first"""
+    return jsonify(orders=open_orders.snapshot(), counts=open_orders.counts())
+
+@bp.route('/orders/<int:order_id>/<action>', methods=['POST'])
+def advance_order(order_id, action):
+    """Apply a workflow action: accept, prepare, ready or collect"""
+    if action not in db.ORDER_ACTIONS:
+        return _error(f'Unknown action: {action}', 404)
+    try:
+        status = db.advance_order(order_id, action)
+    except ValueError as e:
+        return _error(str(e), 409)
+    if status is None:
+        return _error('Order not found', 404)
+    return jsonify(id=order_id, status=status)
@@ -1,47 +1,84 @@
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, Response, render_template, request, redirect, url_for, session, jsonify, abort
 import database as db
+import session_store
+import api
+from order_feed import get_feed
+from open_orders import open_orders
+from cart import get_cart, cart_items
+import qr_codes
+import export
+import profiling
+import page_cache
+import assets
+import stores
+import server
+import click
 import os
+import uuid
 
 app = Flask(__name__)
 app.secret_key = 'ctrl-coffee-secret-key-123'
+# 'cookie' (default), or 'memory' / 'sqlite' to keep carts server-side
+app.config['SESSION_BACKEND'] = os.environ.get('COFFEE_SESSION_BACKEND', 'cookie')
+# Table QR codes link here; /qr/ and print-qr-codes need it set
+app.config['PUBLIC_URL'] = os.environ.get('COFFEE_PUBLIC_URL')
+app.config['TABLE_COUNT'] = int(os.environ.get('COFFEE_TABLE_COUNT', 30))
+# COFFEE_PROFILING=1 turns on per-request SQL/template timing and /admin/metrics
+app.config['PROFILING'] = os.environ.get('COFFEE_PROFILING') == '1'
+app.config['PROFILING_SLOW_MS'] = int(os.environ.get('COFFEE_SLOW_MS', profiling.SLOW_REQUEST_MS))
+# With COFFEE_STORES set, <store>.COFFEE_STORE_DOMAIN hosts select a store
+# (as well as /store/<store>/ URLs)
+app.config['STORE_DOMAIN'] = os.environ.get('COFFEE_STORE_DOMAIN')
+db.init_app(app)
+stores.init_app(app)
+session_store.init_app(app)
+profiling.init_app(app)
+assets.init_app(app)
+app.register_blueprint(api.bp)
+db.for_each_store(open_orders.rebuild)
+
+# Next barista action (and its button label) for each open status
+ACTION_LABELS = {'accept': 'Accept', 'prepare': 'Start Preparing', 'ready': 'Mark Ready', 'collect': 'Mark Collected'}
+NEXT_ACTIONS = {from_status: (action, ACTION_LABELS[action])
+                for action, (from_status, _) in db.ORDER_ACTIONS.items()}
+
+STATUS_COLORS = {'pending': '#f59e0b', 'accepted': '#3b82f6', 'preparing': '#8b5cf6',
+                 'ready': '#10b981', 'collected': '#6b7280', 'completed': '#6b7280'}
+
+@app.context_processor
+def order_workflow():
+    return {'next_actions': NEXT_ACTIONS, 'status_colors': STATUS_COLORS}
 
 @app.route('/')
 def index():
     """Home page - show coffee menu"""
-    categories = db.get_coffee_types_by_category()
-    cart_count = len(session.get('cart', []))
-    
-    # Show database stats on home page
-    stats = db.get_database_stats()
-    
-    return render_template('index.html', 
-                         categories=categories, 
-                         cart_count=cart_count,
-                         stats=stats)
+    menu = db.get_available_menu()
+    return page_cache.cache.response(('index', menu.fingerprint), lambda: render_template(
+        'index.html', menu_options=page_cache.cache.fragment('menu_options.html', menu)))
+
+def stock_shortage(coffee_type_id, quantity):
+    """Message if the store has fewer than quantity of an item, else None
+
+    Only a check: stock is taken when the order is placed.
+    """
+    stock = db.get_stock(int(coffee_type_id))
+    if stock is None or quantity <= stock:
+        return None
+    return f"Sorry, only {stock} left" if stock > 0 else "Sorry, that item is sold out"
 
 @app.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
     """Add item to shopping cart"""
-    if 'cart' not in session:
-        session['cart'] = []
-    
-    coffee_type_id = int(request.form['coffee_type_id'])
+    coffee_type_id = str(int(request.form['coffee_type_id']))
     quantity = int(request.form['quantity'])
+    if quantity < 1:
+        abort(400)
     
-    # Check if item already in cart
-    cart = session['cart']
-    item_found = False
-    for item in cart:
-        if item['coffee_type_id'] == coffee_type_id:
-            item['quantity'] += quantity
-            item_found = True
-            break
-    
-    if not item_found:
-        cart.append({
-            'coffee_type_id': coffee_type_id,
-            'quantity': quantity
-        })
+    cart = get_cart()
+    cart[coffee_type_id] = cart.get(coffee_type_id, 0) + quantity
+    shortage = stock_shortage(coffee_type_id, cart[coffee_type_id])
+    if shortage:
+        return shortage
     
     session['cart'] = cart
     return redirect(url_for('view_cart'))
@@ -49,32 +86,12 @@ def add_to_cart():
 @app.route('/cart')
 def view_cart():
     """View shopping cart"""
-    cart_items = []
-    total = 0
-    
-    if 'cart' in session and session['cart']:
-        conn = db.get_db_connection()
-        for item in session['cart']:
-            coffee = conn.execute(
-                'SELECT * FROM coffee_types WHERE id = ?', 
-                (item['coffee_type_id'],)
-            ).fetchone()
-            
-            if coffee:
-                item_total = coffee['price'] * item['quantity']
-                cart_items.append({
-                    'id': coffee['id'],
-                    'name': coffee['name'],
-                    'price': coffee['price'],
-                    'quantity': item['quantity'],
-                    'total': item_total,
-                    'category': coffee['category']
-                })
-                total += item_total
-        conn.close()
+    cart = get_cart()
+    lines, total = db.price_cart(cart_items(cart))
     
-    cart_count = len(session.get('cart', []))
-    return render_template('cart.html', cart_items=cart_items, total=total, cart_count=cart_count)
+    cart_count = len(cart)
+    return render_template('cart.html', cart_items=lines, total=total, cart_count=cart_count,
+                           checkout_key=uuid.uuid4().hex)
 
 @app.route('/update_cart', methods=['POST'])
 def update_cart():
@@ -82,19 +99,19 @@ def update_cart():
     if 'cart' not in session:
         return redirect(url_for('view_cart'))
     
-    cart = session['cart']
-    coffee_type_id = int(request.form['coffee_type_id'])
+    cart = get_cart()
+    coffee_type_id = str(int(request.form['coffee_type_id']))
     quantity = int(request.form['quantity'])
     
     if quantity <= 0:
         # Remove item if quantity is 0 or less
-        cart = [item for item in cart if item['coffee_type_id'] != coffee_type_id]
-    else:
+        cart.pop(coffee_type_id, None)
+    elif coffee_type_id in cart:
+        shortage = stock_shortage(coffee_type_id, quantity)
+        if shortage:
+            return shortage
         # Update quantity
-        for item in cart:
-            if item['coffee_type_id'] == coffee_type_id:
-                item['quantity'] = quantity
-                break
+        cart[coffee_type_id] = quantity
     
     session['cart'] = cart
     return redirect(url_for('view_cart'))
@@ -103,8 +120,8 @@ def update_cart():
 def remove_from_cart(coffee_type_id):
     """Remove item from cart"""
     if 'cart' in session:
-        cart = session['cart']
-        cart = [item for item in cart if item['coffee_type_id'] != coffee_type_id]
+        cart = get_cart()
+        cart.pop(str(coffee_type_id), None)
         session['cart'] = cart
     
     return redirect(url_for('view_cart'))
@@ -112,7 +129,18 @@ def remove_from_cart(coffee_type_id):
 @app.route('/checkout', methods=['POST'])
 def checkout():
     """Process checkout and create order"""
-    if 'cart' not in session or not session['cart']:
+    # The cart form carries a key minted when it was rendered; kiosks may
+    # send their own. A repeat submit shows the order the key placed.
+    key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+    if key and len(key) > db.MAX_IDEMPOTENCY_KEY_LENGTH:
+        abort(400)
+    order_id = db.get_idempotent_order(key) if key else None
+    order_details = db.get_order_details(order_id) if order_id is not None else None
+    if order_details is not None:
+        return render_template('order_confirmation.html', order_id=order_id, order_details=order_details)
+
+    cart = get_cart()
+    if not cart:
         return redirect(url_for('index'))
     
     customer_name = request.form['customer_name']
@@ -120,7 +148,7 @@ def checkout():
         return "Please enter your name"
     
     try:
-        order_id = db.place_order(customer_name, session['cart'])
+        order_id = db.place_order(customer_name, cart_items(cart), key)
         
         # Get order details for the summary
         order_details = db.get_order_details(order_id)
@@ -128,114 +156,283 @@ def checkout():
         # Clear cart after successful order
         session.pop('cart', None)
         
-        # Show simple order summary
-        return f'''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Order Complete - ctrl+coffee</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; background: #f8f4e9; margin: 0; padding: 2rem; }}
-                .container {{ max-width: 600px; margin: 2rem auto; background: white; padding: 2rem; border-radius: 12px; box-shadow: 0 4px 20px rgba(139, 69, 19, 0.1); }}
-                .success {{ color: #10b981; font-size: 3rem; text-align: center; margin-bottom: 1rem; }}
-                .order-info {{ background: #f0f8ff; padding: 1.5rem; border-radius: 8px; margin: 1rem 0; }}
-                .item {{ display: flex; justify-content: space-between; padding: 0.5rem 0; border-bottom: 1px solid #eee; }}
-                .total {{ font-size: 1.3rem; font-weight: bold; text-align: right; margin-top: 1rem; padding-top: 1rem; border-top: 2px solid #8B4513; }}
-                .btn {{ background: #8B4513; color: white; padding: 0.75rem 1.5rem; text-decoration: none; border-radius: 8px; display: inline-block; margin: 0.5rem; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="success">✓</div>
-                <h1 style="text-align: center; color: #8B4513;">Order Complete!</h1>
-                <p style="text-align: center;">Thank you, {customer_name}!</p>
-                
-                <div class="order-info">
-                    <h3>Order Summary</h3>
-                    <p><strong>Order #:</strong> {order_id}</p>
-                    <p><strong>Date:</strong> {order_details['order']['order_date']}</p>
-                    
-                    <h4>Items:</h4>
-                    {''.join(f'<div class="item"><span>{item["coffee_name"]} x {item["quantity"]}</span><span>${item["price"] * item["quantity"]:.2f}</span></div>' for item in order_details['items'])}
-                    
-                    <div class="total">
-                        Total: ${order_details['order']['total_amount']:.2f}
-                    </div>
-                </div>
-                
-                <p style="text-align: center; background: #ffe6e6; padding: 1rem; border-radius: 8px;">
-                    <strong>Please proceed to the counter to pay and collect your order.</strong>
-                </p>
-                
-                <div style="text-align: center; margin-top: 2rem;">
-                    <a href="/" class="btn">Back to Home</a>
-                    <a href="/menu" class="btn" style="background: #6b7280;">Order More</a>
-                </div>
-            </div>
-        </body>
-        </html>
-        '''
+        return render_template('order_confirmation.html', order_id=order_id, order_details=order_details)
         
     except Exception as e:
         return f"Error placing order: {str(e)}"
 
 @app.route('/orders')
 def orders():
-    """Show all orders"""
-    all_orders = db.get_all_orders()
-    return render_template('orders.html', orders=all_orders)
+    """Show orders one page at a time, newest first"""
+    before = None
+    if request.args.get('before'):
+        # Cursor is "<order_date>|<id>" of the last order on the previous page
+        order_date, _, order_id = request.args['before'].rpartition('|')
+        if not order_id.isdigit():
+            abort(400)
+        before = (order_date, int(order_id))
+    page_size = request.args.get('per_page', db.ORDERS_PAGE_SIZE, type=int)
+    
+    page, next_cursor = db.get_orders_page(before, page_size)
+    next_page = None
+    if next_cursor:
+        next_page = url_for('orders', before=f'{next_cursor[0]}|{next_cursor[1]}', per_page=page_size)
+    
+    return render_template('orders.html',
+                         orders=page,
+                         next_page=next_page,
+                         is_first_page=before is None,
+                         stats=db.get_database_stats())
+
+@app.route('/orders/search')
+def search_orders():
+    """Find orders by customer or item name (?q=)"""
+    query = request.args.get('q', '').strip()
+    results, corrected = db.search_orders(query) if query else ([], None)
+    return render_template('order_search.html', query=query, results=results, corrected=corrected)
+
+@app.route('/orders/stream')
+def orders_stream():
+    """Server-Sent Events feed of new orders and status changes"""
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    return Response(get_feed().stream(last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/orders/open')
+def open_tickets():
+    """Live queue of orders still being worked on"""
+    tickets = open_orders.snapshot()
+    return render_template('open_orders.html', tickets=tickets, counts=open_orders.counts())
+
+@app.route('/orders/<int:order_id>/<action>', methods=['POST'])
+def advance_order(order_id, action):
+    """Move an order to the next workflow status (accept, prepare, ready, collect)"""
+    if action not in db.ORDER_ACTIONS:
+        abort(404)
+    try:
+        status = db.advance_order(order_id, action)
+    except ValueError:
+        abort(409)
+    if status is None:
+        abort(404)
+    return redirect(request.referrer or url_for('open_tickets'))
 
 @app.route('/menu')
 def menu():
     """Show coffee menu"""
-    categories = db.get_coffee_types_by_category()
-    cart_count = len(session.get('cart', []))
-    return render_template('menu.html', categories=categories, cart_count=cart_count)
+    menu = db.get_available_menu()
+    cart_count = len(get_cart())
+    return page_cache.cache.response(('menu', menu.fingerprint, cart_count), lambda: render_template(
+        'menu.html', menu_items=page_cache.cache.fragment('menu_items.html', menu), cart_count=cart_count))
+
+def table_menu_url(table_id):
+    """Menu link printed on a table's QR code"""
+    return app.config['PUBLIC_URL'].rstrip('/') + url_for('menu', table=table_id)
+
+@app.route('/qr/<int:table_id>.png')
+def table_qr(table_id):
+    """QR code for a table's menu, rendered once and then served from cache"""
+    # Never build the link from the Host header: each new value would add
+    # a render to the disk cache
+    if not app.config['PUBLIC_URL'] or not 1 <= table_id <= app.config['TABLE_COUNT']:
+        abort(404)
+    size = request.args.get('size', qr_codes.DEFAULT_SIZE, type=int)
+    if size not in qr_codes.QR_SIZES:
+        abort(400)
+    etag, png = qr_codes.cache.get(table_menu_url(table_id), size)
+    response = Response(png, mimetype='image/png')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response.make_conditional(request)
 
 @app.route('/admin/remove_order', methods=['GET', 'POST'])
 def remove_order():
     """Web interface to remove orders"""
     if request.method == 'POST':
         customer_name = request.form['customer_name']
-        conn = db.get_db_connection()
+        db.remove_orders_by_customer(customer_name)
         
-        # First delete order items, then orders
-        conn.execute('DELETE FROM order_items WHERE order_id IN (SELECT id FROM orders WHERE customer_name = ?)', (customer_name,))
-        conn.execute('DELETE FROM orders WHERE customer_name = ?', (customer_name,))
-        conn.commit()
-        conn.close()
-        
-        return f'''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Order Removed - ctrl+coffee</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; background: #f8f4e9; margin: 0; padding: 2rem; }}
-                .container {{ max-width: 600px; margin: 2rem auto; background: white; padding: 2rem; border-radius: 12px; box-shadow: 0 4px 20px rgba(139, 69, 19, 0.1); text-align: center; }}
-                .success {{ color: #10b981; font-size: 4rem; margin-bottom: 1rem; }}
-                .btn {{ background: #8B4513; color: white; padding: 0.75rem 1.5rem; text-decoration: none; border-radius: 8px; display: inline-block; margin: 0.5rem; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="success">✓</div>
-                <h1 style="color: #8B4513;">Orders Removed</h1>
-                <p>All orders for <strong>{customer_name}</strong> have been successfully removed.</p>
-                <div style="margin-top: 2rem;">
-                    <a href="/admin/remove_order" class="btn">Remove More Orders</a>
-                    <a href="/" class="btn" style="background: #6b7280;">Back to Home</a>
-                </div>
-            </div>
-        </body>
-        </html>
-        '''
+        return render_template('order_removed.html', customer_name=customer_name)
     
     return render_template('remove_order.html')
 
+@app.route('/admin/export/orders.<fmt>')
+def export_orders(fmt):
+    """Stream the order history as CSV or NDJSON (?start=&end=&status=&archived=1)"""
+    if fmt not in export.EXPORT_FORMATS:
+        abort(404)
+    try:
+        start, end, statuses = export.parse_filters(
+            request.args.get('start'), request.args.get('end'), request.args.get('status'))
+    except ValueError as e:
+        return str(e), 400
+    archived = request.args.get('archived') == '1'
+    response = Response(export.export_orders(fmt, start, end, statuses, archived), mimetype=export.EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=orders.{fmt}'
+    return response
+
+@app.route('/admin/analytics')
+def analytics():
+    """Sales dashboard, read from the rollup tables only (?stores=all: every store)"""
+    days = request.args.get('days', str(db.ANALYTICS_DAYS))
+    if days == 'all':
+        days = None
+    elif days.isdigit() and int(days) > 0:
+        days = int(days)
+    else:
+        abort(400)
+    scope = request.args.get('stores')
+    if scope == 'all':
+        by_store, sales = db.get_sales_by_store(days)
+    else:
+        by_store, sales = None, db.get_sales_analytics(days)
+    return render_template('analytics.html', sales=sales, days=days, scope=scope, by_store=by_store,
+                           store_ids=db.store_ids(), store=db.current_store_id(),
+                           busiest=max(sales['hourly'].values()) or 1,
+                           best_day=max((day['revenue'] for day in sales['daily']), default=0) or 1)
+
+@app.route('/admin/pool')
+def pool_stats():
+    """Connection pool and write queue counters for this worker"""
+    return jsonify(pool=db.get_pool_stats(), writer=db.get_writer_stats(), inventory=db.get_inventory_stats())
+
+@app.route('/admin/workers')
+def worker_stats():
+    """Heartbeats of the `flask serve` workers"""
+    workers = server.worker_status()
+    return jsonify(pid=os.getpid(), workers=workers,
+                   healthy=all(worker['healthy'] for worker in workers))
+
+@app.cli.command('serve')
+@click.option('--host', default='0.0.0.0', show_default=True)
+@click.option('--port', default=8000, show_default=True)
+@click.option('--workers', '-w', type=click.IntRange(1), help='Worker processes (default: one per CPU).')
+@click.option('--reuse-port', is_flag=True, help='Give each worker its own SO_REUSEPORT socket.')
+@click.option('--max-requests', default=0, show_default=True, help='Restart a worker after this many requests (0: never).')
+@click.option('--graceful-timeout', default=server.GRACEFUL_TIMEOUT, show_default=True,
+              help='Seconds a stopping worker gets to finish its requests.')
+def serve_command(host, port, workers, reuse_port, max_requests, graceful_timeout):
+    """Serve the app from a pool of worker processes (production)."""
+    server.serve(app, host, port, workers, reuse_port=reuse_port, max_requests=max_requests,
+                 graceful_timeout=graceful_timeout)
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Minify, fingerprint and precompress the static assets."""
+    for path, name in assets.build(app.static_folder).items():
+        print(f"{path} -> {assets.BUILD_DIR}/{name}")
+
+@app.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Rebuild the home page stats counters from the orders tables."""
+    before, after = db.reconcile_stats()
+    for key in after:
+        drift = after[key] - before[key]
+        print(f"{key}: {before[key]} -> {after[key]} (drift {drift:+g})")
+
+@app.cli.command('archive-orders')
+@click.option('--days', default=db.ARCHIVE_AFTER_DAYS, show_default=True, help='Archive closed orders older than this.')
+@click.option('--batch-size', default=db.ARCHIVE_BATCH_SIZE, show_default=True, help='Orders moved per transaction.')
+@click.option('--vacuum', is_flag=True, help='VACUUM the live database afterwards to return the space.')
+def archive_orders_command(days, batch_size, vacuum):
+    """Move old closed orders into monthly archive databases."""
+    moved = db.archive_orders(days, batch_size)
+    for month, count in sorted(moved.items()):
+        print(f"{month}: {count} orders -> {db.archive_path(month)}")
+    print(f"Archived {sum(moved.values())} orders")
+    if vacuum and moved:
+        db.vacuum()
+
+@app.cli.command('backfill-analytics')
+def backfill_analytics_command():
+    """Rebuild the sales rollups from the orders on file."""
+    daily, hourly, items = db.rebuild_sales_rollups()
+    print(f"Rebuilt {daily} daily, {hourly} hourly and {items} item rollup rows")
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Repopulate the order search index (e.g. after renaming menu items)."""
+    print(f"Indexed {db.rebuild_search_index()} orders")
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    # init_app() already migrated on import; report where we ended up
+    print(f"Schema version {db.get_schema_version()}")
+
+@app.cli.command('check-plans')
+def check_plans_command():
+    """Fail if a hot query would do a full table scan."""
+    problems = db.check_query_plans()
+    for name, detail in problems:
+        print(f"FULL SCAN in {name}: {detail}")
+    if problems:
+        raise SystemExit(1)
+    print(f"All {len(db.HOT_QUERIES)} hot queries use an index.")
+
+@app.cli.command('stock')
+def stock_command():
+    """List the tracked items and their stock."""
+    items = db.get_inventory()
+    for item in items:
+        print(f"{item['id']:>4}  {item['name'] or '(not on the menu)':<30} {item['on_hand']}")
+    if not items:
+        print("No items are tracked; set counts with `flask set-stock`.")
+
+@app.cli.command('set-stock')
+@click.argument('coffee_type_id', type=int)
+@click.argument('on_hand')
+def set_stock_command(coffee_type_id, on_hand):
+    """Set an item's stock count, or `untracked` to stop counting it."""
+    if on_hand == 'untracked':
+        on_hand = None
+    elif not on_hand.isdigit():
+        raise click.BadParameter("a count, or 'untracked'", param_hint='ON_HAND')
+    try:
+        db.set_stock(coffee_type_id, None if on_hand is None else int(on_hand))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"{db.get_coffee_type(coffee_type_id)['name']}: {on_hand if on_hand is not None else 'untracked'}")
+
+@app.cli.command('print-qr-codes')
+@click.option('--out', default='qr_print', show_default=True, help='Directory for the table PNGs.')
+@click.option('--size', default=qr_codes.DEFAULT_SIZE, show_default=True, type=click.Choice([str(s) for s in qr_codes.QR_SIZES]))
+@click.option('--workers', type=int, help='Render processes (default: one per CPU).')
+def print_qr_codes_command(out, size, workers):
+    """Render a QR code for every table, ready for printing."""
+    if not app.config['PUBLIC_URL']:
+        raise click.UsageError('Set COFFEE_PUBLIC_URL to the address customers will scan.')
+    size = int(size)
+    with app.test_request_context():
+        urls = {table_id: table_menu_url(table_id) for table_id in range(1, app.config['TABLE_COUNT'] + 1)}
+    codes = qr_codes.cache.render_many(urls.values(), size, workers)
+
+    os.makedirs(out, exist_ok=True)
+    for table_id, url in urls.items():
+        with open(os.path.join(out, f'table-{table_id:02d}.png'), 'wb') as f:
+            f.write(codes[url][1])
+    stats = qr_codes.cache.stats()
+    print(f"Wrote {len(urls)} QR codes to {out} ({stats['renders']} rendered, {len(urls) - stats['renders']} cached)")
+
+@app.cli.command('export-orders')
+@click.option('--format', 'fmt', type=click.Choice(list(export.EXPORT_FORMATS)), default='csv', show_default=True)
+@click.option('--start', help='First order date to include (YYYY-MM-DD).')
+@click.option('--end', help='Last order date to include (YYYY-MM-DD).')
+@click.option('--status', help='Comma-separated statuses to include.')
+@click.option('--archived', is_flag=True, help='Include orders moved to the monthly archives.')
+@click.option('--out', type=click.File('w'), default='-', help='Output file (default: stdout).')
+def export_orders_command(fmt, start, end, status, archived, out):
+    """Write the order history as CSV or NDJSON."""
+    try:
+        start, end, statuses = export.parse_filters(start, end, status)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    for chunk in export.export_orders(fmt, start, end, statuses, archived):
+        out.write(chunk)
+
 if __name__ == '__main__':
-    # Initialize database only if it doesn't exist
-    db.init_db()
+    # Database is created and migrated by db.init_app() above
     
     # Show current database stats
     stats = db.get_database_stats()
@@ -244,4 +441,5 @@ if __name__ == '__main__':
     # Run the application
     print("Starting ctrl+coffee app...")
     print("Open your browser and go to: http://localhost:5000")
+    print("(development server; use `flask --app app serve` in production)")
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,131 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # optional: pip install brotli
+
+# Source files under static/ that get built; each one is minified, named by
+# its content hash and written alongside .gz/.br copies
+ASSETS = ['css/base.css']
+
+BUILD_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+# Built names change whenever the content does, so browsers may keep them
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Quoted strings are copied as-is; comments are dropped; the rest is squeezed
+_CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|([^"'/]+|/)''', re.S)
+
+def minify_css(css):
+    """Strip comments and insignificant whitespace from a stylesheet"""
+    out = []
+    for string, comment, text in _CSS_TOKENS.findall(css):
+        if string:
+            out.append(string)
+        elif text:
+            text = re.sub(r'\s+', ' ', text)
+            text = re.sub(r' ?([{};,>]) ?', r'\1', text)
+            text = re.sub(r': ', ':', text)
+            out.append(text)
+    return re.sub(r';}', '}', ''.join(out)).strip()
+
+MINIFIERS = {
+    '.css': minify_css,
+}
+
+def build(static_folder, assets=ASSETS):
+    """Minify, fingerprint and precompress assets into static/dist
+
+    Returns the manifest, {source path: built name}, which is also written
+    to static/dist/manifest.json.
+    """
+    out_dir = os.path.join(static_folder, BUILD_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    for path in assets:
+        with open(os.path.join(static_folder, path), encoding='utf-8') as f:
+            source = f.read()
+        stem, ext = os.path.splitext(os.path.basename(path))
+        body = MINIFIERS.get(ext, lambda text: text)(source).encode()
+        name = f'{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}'
+        variants = {name: body, name + '.gz': gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            variants[name + '.br'] = brotli.compress(body, quality=11)
+        for filename, data in variants.items():
+            _write(os.path.join(out_dir, filename), data)
+        manifest[path] = name
+    _write(os.path.join(out_dir, MANIFEST), json.dumps(manifest, indent=2).encode())
+    return manifest
+
+def _write(path, data):
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return
+    except FileNotFoundError:
+        pass
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+def _stale(static_folder, manifest):
+    out_dir = os.path.join(static_folder, BUILD_DIR)
+    for path in ASSETS:
+        built = os.path.join(out_dir, manifest.get(path, ''))
+        if path not in manifest or not os.path.exists(built):
+            return True
+        if os.path.getmtime(os.path.join(static_folder, path)) > os.path.getmtime(built):
+            return True
+    return False
+
+def load(static_folder):
+    """The built manifest, rebuilding first if a source is newer"""
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    if _stale(static_folder, manifest):
+        manifest = build(static_folder)
+    return manifest
+
+def init_app(app):
+    """Serve built assets from /assets/ and add asset_url() to templates"""
+    manifest = load(app.static_folder)
+    out_dir = os.path.join(app.static_folder, BUILD_DIR)
+
+    def asset_url(path):
+        """Fingerprinted URL of a static file (plain /static/ URL if it is not built)"""
+        if path in manifest:
+            return url_for('asset', filename=manifest[path])
+        return url_for('static', filename=path)
+
+    def asset(filename):
+        """A built asset, precompressed when the client accepts it"""
+        mimetype = mimetypes.guess_type(filename)[0]
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[candidate] and os.path.exists(os.path.join(out_dir, filename + suffix)):
+                encoding = candidate
+                filename += suffix
+                break
+        response = send_from_directory(out_dir, filename, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.add_url_rule('/assets/<path:filename>', 'asset', asset)
+    return manifest
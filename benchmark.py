@@ -0,0 +1,332 @@
+"""Load test the ordering flow.
+
+Seed a database of any size, then drive the app with a synthetic traffic
+profile or a recorded request log, either in-process through Flask's test
+client or over HTTP against a real WSGI server:
+
+    python benchmark.py seed --orders 1000000 --db bench.db
+    python benchmark.py run --db bench.db --profile lunch-rush --requests 5000
+    python benchmark.py run --db bench.db --replay traffic.jsonl --server
+
+Replay logs hold one JSON object per line with "path" and optionally
+"method", "form", "json" and "session"; lines without a "path" are
+skipped. Lines sharing a "session" are replayed in order by one virtual
+user so carts carry over to checkout.
+"""
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+import click
+
+# Relative weights of the user journeys each profile mixes
+PROFILES = {
+    'lunch-rush': {'browse': 35, 'cart': 25, 'checkout': 25, 'orders': 10, 'home': 5},
+    'browse': {'browse': 60, 'home': 30, 'cart': 10},
+    'kitchen': {'orders': 70, 'checkout': 30},
+}
+
+SEED_CUSTOMERS = ['alex', 'sam', 'priya', 'chen', 'maria', 'omar', 'li', 'kofi', 'ana', 'raj']
+
+def seed_database(path, orders, days=365, chunk_size=10000, seed=1):
+    """Create path from schema.sql + migrations and fill it with orders"""
+    os.environ['COFFEE_DB'] = path
+    import database as db
+    db.init_db()
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute('PRAGMA synchronous = OFF')
+    prices = dict(conn.execute('SELECT id, price FROM coffee_types'))
+    menu_ids = list(prices)
+    next_id = (conn.execute('SELECT MAX(id) FROM orders').fetchone()[0] or 0) + 1
+    start = datetime.now() - timedelta(days=days)
+    span = days * 24 * 60 * 60
+
+    with click.progressbar(length=orders, label='Seeding orders') as bar:
+        for first in range(next_id, next_id + orders, chunk_size):
+            order_rows = []
+            item_rows = []
+            for order_id in range(first, min(first + chunk_size, next_id + orders)):
+                # Sorted ids get sorted dates, like a real order history
+                offset = (order_id - next_id) * span // max(orders, 1)
+                order_date = (start + timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S')
+                total = 0
+                for coffee_type_id in rng.sample(menu_ids, rng.randint(1, 4)):
+                    quantity = rng.randint(1, 3)
+                    total += prices[coffee_type_id] * quantity
+                    item_rows.append((order_id, coffee_type_id, quantity, prices[coffee_type_id]))
+                # History is collected; only the newest few are still in the queue
+                status = 'collected' if next_id + orders - order_id > 20 else rng.choice(db.OPEN_STATUSES)
+                order_rows.append((order_id, rng.choice(SEED_CUSTOMERS), order_date,
+                                   round(total, 2), status))
+            conn.execute('BEGIN')
+            conn.executemany(
+                'INSERT INTO orders (id, customer_name, order_date, total_amount, status) VALUES (?, ?, ?, ?, ?)',
+                order_rows
+            )
+            conn.executemany(
+                'INSERT INTO order_items (order_id, coffee_type_id, quantity, price) VALUES (?, ?, ?, ?)',
+                item_rows
+            )
+            conn.execute('COMMIT')
+            bar.update(len(order_rows))
+
+    conn.execute('ANALYZE')
+    conn.close()
+    # Seeded rows bypass place_order(), so bring the sales rollups up to date
+    db.rebuild_sales_rollups()
+
+class TestClientDriver:
+    """One virtual user talking to the app through Flask's test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None, json_body=None):
+        response = self.client.open(path, method=method, data=form, json=json_body)
+        return response.status_code, response.get_data()
+
+class HttpDriver:
+    """One virtual user talking HTTP to a running server, keeping its cookies"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, form=None, json_body=None):
+        headers = {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={m.value}' for k, m in self.cookies.items())
+
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+            for header in response.headers.get_all('Set-Cookie') or []:
+                self.cookies.load(header)
+            return response.status, data
+        finally:
+            conn.close()
+
+def _journey(kind, rng, menu_ids):
+    """Requests one virtual user makes for a journey, as (label, method, path, form)"""
+    if kind == 'home':
+        return [('home', 'GET', '/', None)]
+    if kind == 'browse':
+        return [('menu', 'GET', '/menu', None), ('api menu', 'GET', '/api/menu', None)]
+    if kind == 'orders':
+        return [('orders', 'GET', '/orders', None)]
+
+    steps = []
+    picks = rng.sample(menu_ids, rng.randint(1, 4))
+    for coffee_type_id in picks:
+        steps.append(('add to cart', 'POST', '/add_to_cart',
+                      {'coffee_type_id': coffee_type_id, 'quantity': rng.randint(1, 3)}))
+    if kind == 'cart':
+        steps.append(('update cart', 'POST', '/update_cart',
+                      {'coffee_type_id': picks[0], 'quantity': rng.randint(0, 5)}))
+        steps.append(('remove from cart', 'GET', f'/remove_from_cart/{picks[-1]}', None))
+        steps.append(('cart', 'GET', '/cart', None))
+    else:
+        steps.append(('cart', 'GET', '/cart', None))
+        steps.append(('checkout', 'POST', '/checkout', {'customer_name': rng.choice(SEED_CUSTOMERS)}))
+    return steps
+
+def _synthetic_work(profile, count, rng, menu_ids):
+    """Journeys drawn from a profile until they add up to count requests"""
+    kinds = list(PROFILES[profile])
+    weights = [PROFILES[profile][k] for k in kinds]
+    journeys = []
+    total = 0
+    while total < count:
+        journey = _journey(rng.choices(kinds, weights)[0], rng, menu_ids)
+        journeys.append(journey)
+        total += len(journey)
+    return journeys
+
+def _replay_work(path, count):
+    """Journeys from a request log, one per "session" (or per line)"""
+    journeys = {}
+    total = 0
+    with open(path) as f:
+        for number, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if 'path' not in entry:
+                continue
+            method = entry.get('method', 'GET').upper()
+            label = f"{method} {entry['path'].split('?')[0]}"
+            step = (label, method, entry['path'], entry.get('form') or entry.get('json'))
+            journeys.setdefault(entry.get('session', number), []).append(step)
+            total += 1
+            if count and total >= count:
+                break
+    return list(journeys.values())
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+def run_benchmark(journeys, make_driver, concurrency):
+    """Play journeys on concurrency virtual users; returns per-label timings"""
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    lock_errors = [0]
+    lock = threading.Lock()
+
+    def user(chunk):
+        driver = make_driver()
+        steps = [step for journey in chunk for step in journey]
+        for label, method, path, payload in steps:
+            json_body = payload if path.startswith('/api/') and method != 'GET' else None
+            form = payload if json_body is None else None
+            started = time.perf_counter()
+            status, body = driver.request(method, path, form=form, json_body=json_body)
+            elapsed = time.perf_counter() - started
+            with lock:
+                timings[label].append(elapsed)
+                if status >= 500 or b'Error placing order' in body:
+                    errors[label] += 1
+                if b'database is locked' in body:
+                    lock_errors[0] += 1
+
+    # Whole journeys per user, so a cart and its checkout share cookies
+    chunks = [journeys[i::concurrency] for i in range(concurrency)]
+    threads = [threading.Thread(target=user, args=(chunk,)) for chunk in chunks if chunk]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, timings, errors, lock_errors[0]
+
+def _report(elapsed, timings, errors, lock_errors, writer_before, writer_after, pool):
+    total = sum(len(v) for v in timings.values())
+    writes = writer_after['jobs'] - writer_before['jobs']
+    wait = writer_after['queue_wait_seconds'] - writer_before['queue_wait_seconds']
+    report = {
+        'requests': total,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(total / elapsed, 1) if elapsed else 0,
+        'endpoints': {},
+        'sqlite': {
+            'lock_errors': lock_errors,
+            'writes': writes,
+            'write_batches': writer_after['batches'] - writer_before['batches'],
+            'write_queue_wait_ms_avg': round(wait / writes * 1000, 3) if writes else 0,
+            'pool': pool,
+        },
+    }
+    for label, values in sorted(timings.items()):
+        values.sort()
+        report['endpoints'][label] = {
+            'count': len(values),
+            'errors': errors[label],
+            'p50_ms': round(_percentile(values, 50) * 1000, 2),
+            'p95_ms': round(_percentile(values, 95) * 1000, 2),
+            'p99_ms': round(_percentile(values, 99) * 1000, 2),
+            'max_ms': round(values[-1] * 1000, 2),
+        }
+    return report
+
+def _print_report(report):
+    click.echo(f"{report['requests']} requests in {report['seconds']}s "
+               f"({report['requests_per_second']} req/s)")
+    click.echo(f"{'endpoint':<20}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, row in report['endpoints'].items():
+        click.echo(f"{label:<20}{row['count']:>8}{row['errors']:>8}{row['p50_ms']:>10}"
+                   f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+    sqlite_stats = report['sqlite']
+    click.echo(f"SQLite: {sqlite_stats['lock_errors']} 'database is locked' errors, "
+               f"{sqlite_stats['writes']} writes in {sqlite_stats['write_batches']} commits, "
+               f"avg write queue wait {sqlite_stats['write_queue_wait_ms_avg']} ms")
+
+@click.group()
+def cli():
+    """ctrl+coffee load testing tools."""
+
+@cli.command()
+@click.option('--db', 'path', default='bench.db', show_default=True, help='Database file to create or extend.')
+@click.option('--orders', default=10000, show_default=True, help='Number of orders to add.')
+@click.option('--days', default=365, show_default=True, help='Spread order dates over this many days.')
+@click.option('--chunk-size', default=10000, show_default=True, help='Orders per transaction.')
+def seed(path, orders, days, chunk_size):
+    """Fill a benchmark database with synthetic orders."""
+    seed_database(path, orders, days=days, chunk_size=chunk_size)
+    click.echo(f"Seeded {orders} orders into {path}")
+
+@cli.command()
+@click.option('--db', 'path', default='bench.db', show_default=True, help='Seeded database to run against.')
+@click.option('--profile', type=click.Choice(sorted(PROFILES)), default='lunch-rush', show_default=True)
+@click.option('--replay', type=click.Path(exists=True), help='Replay a JSON-lines request log instead of a profile.')
+@click.option('--requests', 'count', default=2000, show_default=True, help='Requests to send (0 = whole replay log).')
+@click.option('--concurrency', default=8, show_default=True, help='Concurrent virtual users.')
+@click.option('--server', is_flag=True, help='Go over HTTP to a threaded WSGI server instead of the test client.')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON.')
+@click.option('--seed', 'random_seed', default=1, show_default=True)
+def run(path, profile, replay, count, concurrency, server, as_json, random_seed):
+    """Drive the app with a traffic profile or a replay log and report latencies."""
+    if not os.path.exists(path):
+        raise click.ClickException(f"{path} does not exist; run 'benchmark.py seed' first")
+    os.environ['COFFEE_DB'] = path
+    import database as db
+    from app import app
+
+    rng = random.Random(random_seed)
+    if replay:
+        journeys = _replay_work(replay, count)
+    else:
+        journeys = _synthetic_work(profile, count, rng, [item['id'] for item in db.get_coffee_types()])
+    if not journeys:
+        raise click.ClickException('Nothing to send')
+
+    httpd = None
+    if server:
+        from werkzeug.serving import make_server
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no per-request access log
+        httpd = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        make_driver = lambda: HttpDriver('127.0.0.1', httpd.server_port)
+    else:
+        make_driver = lambda: TestClientDriver(app)
+
+    writer_before = db.get_writer_stats()
+    try:
+        elapsed, timings, errors, lock_errors = run_benchmark(journeys, make_driver, concurrency)
+    finally:
+        if httpd is not None:
+            httpd.shutdown()
+    report = _report(elapsed, timings, errors, lock_errors,
+                     writer_before, db.get_writer_stats(), db.get_pool_stats())
+
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+
+if __name__ == '__main__':
+    cli()
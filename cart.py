@@ -0,0 +1,17 @@
+from flask import session
+
+def get_cart():
+    """Session cart as a {coffee_type_id: quantity} map
+
+    Keys are strings because sessions are stored as JSON.
+    """
+    cart = session.get('cart', {})
+    if isinstance(cart, list):
+        # Cookie written before carts became a map
+        cart = {str(item['coffee_type_id']): item['quantity'] for item in cart}
+    return cart
+
+def cart_items(cart):
+    """Expand a cart map into the item list db.price_cart/place_order take"""
+    return [{'coffee_type_id': int(coffee_type_id), 'quantity': quantity}
+            for coffee_type_id, quantity in cart.items()]
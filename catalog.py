@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+
+# How often (seconds) the catalog asks SQLite whether coffee_types changed.
+# Between checks every menu read is served from memory without any SQL.
+CHECK_INTERVAL = 5
+
+# fingerprint is a hash of the menu content: unlike version it is the same
+# in every worker process, so it can go into ETags
+Menu = namedtuple('Menu', 'version fingerprint loaded_at items by_id by_category')
+
+EMPTY_MENU = Menu(0, None, None, [], {}, {})
+
+class MenuCatalog:
+    """Process-wide in-memory copy of the coffee_types table
+
+    Rows are kept as a flat list, an id index and a category grouping. The
+    copy is reloaded when invalidate() is called, or when PRAGMA
+    data_version on the catalog's own connection shows another connection
+    committed since the last check. ``version`` only moves when the menu
+    content actually changed, so it can be used as a cache key.
+    """
+
+    def __init__(self, connect):
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._data_version = None
+        self._checked = None
+        self._fingerprint = None
+        self.menu = EMPTY_MENU
+        self.reloads = 0
+
+    def snapshot(self):
+        """Return the current Menu, reloading it first if it may be stale"""
+        checked = self._checked
+        if checked is None or time.monotonic() - checked >= CHECK_INTERVAL:
+            with self._lock:
+                self._refresh()
+        return self.menu
+
+    def get(self, coffee_type_id):
+        """Look up one coffee type by id (None if unknown)"""
+        return self.snapshot().by_id.get(coffee_type_id)
+
+    def invalidate(self):
+        """Force a reload on the next read"""
+        with self._lock:
+            self._checked = None
+            self._data_version = None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._checked = None
+            self._data_version = None
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            # Never share a connection with a fork()ed parent
+            self._conn = self._connect()
+            self._pid = os.getpid()
+            self._data_version = None
+        return self._conn
+
+    def _refresh(self):
+        checked = self._checked
+        if checked is not None and time.monotonic() - checked < CHECK_INTERVAL:
+            return  # another thread reloaded while we waited for the lock
+
+        conn = self._connection()
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        self._checked = time.monotonic()
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        rows = conn.execute('SELECT * FROM coffee_types ORDER BY category, name').fetchall()
+        items = [dict(row) for row in rows]
+        fingerprint = hashlib.sha1(repr([sorted(item.items()) for item in items]).encode()).hexdigest()
+        if fingerprint == self._fingerprint:
+            return  # something else (e.g. an order) was committed
+        self._fingerprint = fingerprint
+
+        by_category = {}
+        for item in items:
+            by_category.setdefault(item['category'], []).append(item)
+        self.menu = Menu(
+            version=self.menu.version + 1,
+            fingerprint=fingerprint,
+            loaded_at=time.time(),
+            items=items,
+            by_id={item['id']: item for item in items},
+            by_category=by_category,
+        )
+        self.reloads += 1
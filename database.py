@@ -1,15 +1,676 @@
 import sqlite3
 import os
+import queue
+import threading
+import time
+import weakref
+import atexit
+import difflib
+import json
+import math
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
-def get_db_connection():
-    """Create and return a database connection"""
-    conn = sqlite3.connect('coffee_orders.db')
+from blinker import Namespace
+
+from catalog import MenuCatalog
+from inventory import Inventory
+
+DATABASE = os.environ.get('COFFEE_DB', 'coffee_orders.db')
+
+# Multi-store: COFFEE_STORES=downtown,airport gives every café location its
+# own orders database (STORE_DIR/<store>.db) with its own connection pool
+# and writer, while the menu lives in one shared MENU_DATABASE. Left unset
+# there is a single store, DATABASE, which also holds the menu.
+# COFFEE_STORE picks the store used outside a routed request (CLI, scripts).
+STORES = [store.strip() for store in os.environ.get('COFFEE_STORES', '').split(',') if store.strip()]
+STORE_DIR = os.environ.get('COFFEE_STORE_DIR', 'stores')
+MENU_DATABASE = os.environ.get('COFFEE_MENU_DB') or os.path.join(STORE_DIR, 'menu.db')
+DEFAULT_STORE = os.environ.get('COFFEE_STORE') or None
+STORAGE_MODE = os.environ.get('COFFEE_STORAGE_MODE', 'wal')
+
+# Idle connections each pool keeps for the next request; a burst beyond
+# this opens extra connections, closed again when they are handed back
+POOL_SIZE = 8
+
+# Pooled connections are reopened once they get this old (seconds) or have
+# been handed out this many times, and pinged before reuse after sitting
+# idle for longer than the health check interval.
+POOL_MAX_AGE = 300
+POOL_MAX_USES = 10000
+POOL_HEALTH_CHECK_INTERVAL = 30
+
+# Applied once when a connection is opened
+PRAGMAS = [
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+]
+
+# Extra pragmas per storage mode. WAL lets /orders and / keep reading while
+# an order commits; NORMAL sync is durable across app crashes in WAL mode.
+STORAGE_MODES = {
+    'wal': [
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA synchronous = NORMAL',
+        'PRAGMA mmap_size = 268435456',
+        'PRAGMA cache_size = -16384',
+    ],
+    'rollback': [
+        'PRAGMA journal_mode = DELETE',
+        'PRAGMA synchronous = FULL',
+    ],
+}
+
+# Most write jobs the writer thread folds into a single commit
+WRITE_BATCH_SIZE = 64
+
+# Numbered NNNN_name.sql scripts applied in order on top of schema.sql;
+# PRAGMA user_version records the last one applied.
+MIGRATIONS_DIR = 'migrations'
+
+# Closed orders older than ARCHIVE_AFTER_DAYS are moved by archive_orders()
+# into one SQLite file per month (orders-YYYY-MM.db) in ARCHIVE_DIR,
+# ARCHIVE_BATCH_SIZE orders per transaction
+ARCHIVE_DIR = os.environ.get('COFFEE_ARCHIVE_DIR', 'archive')
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 500
+
+# Order changes kept in order_events for other processes to pick up, and
+# how often (seconds) a process's EventRelay looks for new ones
+EVENT_LOG_SIZE = 10000
+EVENT_POLL_INTERVAL = 0.5
+
+# Checkout idempotency keys: how long a key replays its order, how many
+# are kept, and the longest key a client may send
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+MAX_IDEMPOTENCY_KEYS = 100000
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Orders removed per transaction by the bulk delete tools
+DELETE_CHUNK_SIZE = 5000
+
+# /orders/search returns this many results, ranked by relevance among the
+# SEARCH_WINDOW most recent matches so a common name costs the same as a
+# rare one
+SEARCH_RESULTS = 20
+SEARCH_WINDOW = 500
+
+# Spelling suggestions for searches with no results: indexed terms at least
+# this similar (difflib ratio), from at most SUGGEST_CANDIDATES candidates
+SUGGEST_CUTOFF = 0.75
+SUGGEST_CANDIDATES = 2000
+
+# Barista workflow: action name -> (status it applies to, status it sets).
+# 'completed' is the terminal status orders had before the workflow.
+ORDER_ACTIONS = {
+    'accept': ('pending', 'accepted'),
+    'prepare': ('accepted', 'preparing'),
+    'ready': ('preparing', 'ready'),
+    'collect': ('ready', 'collected'),
+}
+OPEN_STATUSES = ('pending', 'accepted', 'preparing', 'ready')
+ORDER_STATUSES = OPEN_STATUSES + ('collected', 'completed')
+
+# /orders page size: default and upper bound for ?per_page=
+ORDERS_PAGE_SIZE = 20
+MAX_ORDERS_PAGE_SIZE = 100
+
+# Rows pulled from the cursor per fetchmany() during an export
+EXPORT_CHUNK_SIZE = 1000
+
+# Default /admin/analytics window, and how many items to rank per category
+ANALYTICS_DAYS = 30
+TOP_ITEMS_PER_CATEGORY = 5
+
+# Sent after the write has committed. The sender is the order id (or the
+# list of ids for orders_removed); order_placed carries order=, a summary
+# shaped like a get_orders_page() row. Every signal carries store=, the id
+# of the store the order belongs to (None for a single store), and
+# event_id=, the change's order_events id: the same in every process, so
+# the live feed can use it as the SSE event id.
+_signals = Namespace()
+order_placed = _signals.signal('order-placed')
+order_status_changed = _signals.signal('order-status-changed')
+orders_removed = _signals.signal('orders-removed')
+
+def connect(database, **kwargs):
+    """Open a connection with the storage mode pragmas applied"""
+    if STORAGE_MODE not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode: {STORAGE_MODE}")
+    conn = sqlite3.connect(database, **kwargs)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS + STORAGE_MODES[STORAGE_MODE]:
+        conn.execute(pragma)
     return conn
 
+# Called as query_observer(sql, seconds) after each statement run on a
+# pooled connection (time to the first row); set by profiling.init_app()
+query_observer = None
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to the pool"""
+
+    def execute(self, sql, parameters=()):
+        observer = query_observer
+        if observer is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observer(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, parameters):
+        observer = query_observer
+        if observer is None:
+            return super().executemany(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            observer(sql, time.perf_counter() - started)
+
+    def close(self):
+        # Callers still close() after every helper; keep the connection
+        # open and just make sure nothing is left half-written.
+        if self.in_transaction:
+            self.rollback()
+
+    def discard(self):
+        """Really close the underlying connection"""
+        super().close()
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by every thread
+
+    A thread checks a connection out on its first query and keeps it until
+    release() at app context teardown, which puts it back for the next
+    request whatever thread that runs on (werkzeug's threaded server starts
+    a new thread per request). Up to POOL_SIZE idle connections are kept.
+    """
+
+    def __init__(self, database, size=POOL_SIZE):
+        self.database = database
+        self.size = size
+        # Last in, first out: the busiest connections stay warm
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = weakref.WeakSet()
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+
+    def _connect(self):
+        conn = connect(self.database, factory=PooledConnection,
+                       check_same_thread=False)
+        conn.pool_pid = os.getpid()
+        conn.pool_opened = conn.pool_used = time.monotonic()
+        conn.pool_uses = 0
+        with self._lock:
+            self._connections.add(conn)
+        return conn
+
+    def _usable(self, conn):
+        """Check a cached connection is still fit to hand out"""
+        now = time.monotonic()
+        if conn.pool_pid != os.getpid():
+            # Inherited across fork(): never touch the parent's handle
+            return False
+        if now - conn.pool_opened > POOL_MAX_AGE or conn.pool_uses >= POOL_MAX_USES:
+            return False
+        if now - conn.pool_used > POOL_HEALTH_CHECK_INTERVAL:
+            try:
+                conn.execute('SELECT 1').fetchone()
+            except sqlite3.Error:
+                return False
+        return True
+
+    def acquire(self):
+        """Return this thread's checked-out connection, checking one out if needed"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or conn.pool_pid != os.getpid():
+            conn = self._checkout()
+            self._local.conn = conn
+        return conn
+
+    def _checkout(self):
+        """An idle connection fit for use, or a new one"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+                with self._lock:
+                    self.misses += 1
+                break
+            if self._usable(conn):
+                with self._lock:
+                    self.hits += 1
+                break
+            self._retire(conn)
+        conn.pool_uses += 1
+        conn.pool_used = time.monotonic()
+        return conn
+
+    def release(self):
+        """Hand this thread's connection back, rolling back anything left open"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        if conn.pool_pid != os.getpid():
+            return
+        conn.close()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            self._retire(conn)
+
+    def _retire(self, conn):
+        with self._lock:
+            self.recycled += 1
+            self._connections.discard(conn)
+        if conn.pool_pid == os.getpid():
+            try:
+                conn.discard()
+            except sqlite3.Error:
+                pass
+
+    def close_all(self):
+        """Close every connection the pool has opened in this process"""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections = weakref.WeakSet()
+        for conn in connections:
+            if conn.pool_pid == os.getpid():
+                conn.discard()
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._local = threading.local()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'recycled': self.recycled,
+                'open_connections': len(self._connections),
+                'idle_connections': self._idle.qsize(),
+            }
+
+class WriteQueue:
+    """Single writer thread that group-commits queued write jobs
+
+    A job is a function taking the writer's connection. Jobs queued while a
+    commit is in flight are run together in the next transaction, each
+    inside its own savepoint so one failing job does not sink the others.
+    """
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.jobs = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.queue_wait = 0.0
+
+    def submit(self, fn, *args):
+        """Queue fn(conn, *args) and return a Future for its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, args, future, time.monotonic()))
+        return future
+
+    def run(self, fn, *args):
+        """Queue a write job and wait for it to commit"""
+        return self.submit(fn, *args).result()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            # First use, or we are a forked child without the parent's thread
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, args=(self._queue,),
+                                            name='db-writer', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Drain pending jobs and stop the writer thread"""
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                return
+            self._queue.put(None)
+            thread, self._thread, self._pid = self._thread, None, None
+        thread.join()
+
+    def _loop(self, jobs):
+        conn = None
+        try:
+            while True:
+                job = jobs.get()
+                if job is None:
+                    return
+                batch = [job]
+                while len(batch) < WRITE_BATCH_SIZE:
+                    try:
+                        job = jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        jobs.put(None)
+                        break
+                    batch.append(job)
+                if conn is None:
+                    try:
+                        conn = connect(self._pool.database, isolation_level=None)
+                    except Exception as e:
+                        for fn, args, future, queued in batch:
+                            future.set_exception(e)
+                        continue
+                self._commit(conn, batch)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _commit(self, conn, batch):
+        started = time.monotonic()
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, args, future, queued in batch:
+                conn.execute('SAVEPOINT job')
+                try:
+                    result = fn(conn, *args)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO job')
+                    results.append((future, None, e))
+                else:
+                    results.append((future, result, None))
+                conn.execute('RELEASE job')
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            results = [(future, None, e) for fn, args, future, queued in batch]
+
+        with self._lock:
+            self.jobs += len(batch)
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.queue_wait += sum(started - queued for _, _, _, queued in batch)
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'jobs': self.jobs,
+                'batches': self.batches,
+                'largest_batch': self.largest_batch,
+                'queue_wait_seconds': round(self.queue_wait, 6),
+            }
+
+class EventRelay:
+    """Re-send the order signals for changes committed by other processes
+
+    A background thread watches PRAGMA data_version and reads new
+    order_events rows, so the feed and open-orders index of every worker
+    of a multi-process server see every order, not just their own.
+    """
+
+    def __init__(self, store, interval=EVENT_POLL_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self.relayed = 0
+
+    def start(self):
+        """Start tailing from the newest event (once per process)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._loop, name='db-event-relay', daemon=True).start()
+
+    def _loop(self):
+        conn = connect(self.store.database)
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM order_events').fetchone()[0]
+        data_version = None
+        while True:
+            time.sleep(self.interval)
+            try:
+                version = conn.execute('PRAGMA data_version').fetchone()[0]
+                if version == data_version:
+                    continue
+                data_version = version
+                rows = conn.execute(
+                    'SELECT id, pid, kind, data FROM order_events WHERE id > ? ORDER BY id', (last_id,)
+                ).fetchall()
+            except sqlite3.Error:
+                continue
+            for row in rows:
+                last_id = row['id']
+                if row['pid'] != os.getpid():
+                    try:
+                        self._send(row['id'], row['kind'], json.loads(row['data']))
+                    except Exception:
+                        pass  # a failing receiver must not stop the relay
+
+    def _send(self, event_id, kind, data):
+        self.relayed += 1
+        store = self.store.id
+        if kind == 'order':
+            order_placed.send(data['id'], order=data, store=store, event_id=event_id)
+        elif kind == 'status':
+            order_status_changed.send(data['id'], status=data['status'], store=store, event_id=event_id)
+        elif kind == 'removed':
+            orders_removed.send(data['ids'], store=store, event_id=event_id)
+
+class Store:
+    """One café location: its orders database, connection pool and writer"""
+
+    def __init__(self, store_id, database):
+        self.id = store_id
+        self.pool = ConnectionPool(database)
+        self.writer = WriteQueue(self.pool)
+        self.relay = EventRelay(self)
+        self.inventory = Inventory(lambda: _load_stock(self),
+                                   lambda changes: self.writer.run(_apply_stock_changes, changes))
+        # (menu fingerprint, sold-out ids, changed_at) -> menu without the sold-out items
+        self.available_menu = None
+        # Fingerprint of the shared menu last copied into coffee_types
+        self.menu_fingerprint = None
+
+    @property
+    def database(self):
+        return self.pool.database
+
+    @property
+    def archive_dir(self):
+        return ARCHIVE_DIR if self.id is None else os.path.join(ARCHIVE_DIR, self.id)
+
+    def close(self):
+        self.inventory.close()
+        self.writer.stop()
+        self.pool.close_all()
+
+for _store_id in STORES:
+    if not re.fullmatch(r'[a-z0-9][a-z0-9-]*', _store_id):
+        raise ValueError(f"Store ids are lowercase letters, digits and dashes: {_store_id!r}")
+_stores = {store_id: Store(store_id, os.path.join(STORE_DIR, f'{store_id}.db')) for store_id in STORES}
+if not _stores:
+    _stores[None] = Store(None, DATABASE)
+if DEFAULT_STORE not in _stores and DEFAULT_STORE is not None:
+    raise ValueError(f"COFFEE_STORE={DEFAULT_STORE!r} is not one of COFFEE_STORES")
+for _store in _stores.values():
+    atexit.register(_store.writer.stop)
+    # atexit runs last-registered first: stock is flushed while the writer is up
+    atexit.register(_store.inventory.close)
+
+_current_store = ContextVar('store', default=None)
+
+def _menu_database():
+    return MENU_DATABASE if STORES else _stores[None].database
+
+_catalog = MenuCatalog(lambda: connect(_menu_database(), check_same_thread=False))
+
+def _store():
+    """The Store this thread is working on"""
+    store = _current_store.get() or _stores.get(DEFAULT_STORE)
+    if store is None:
+        raise LookupError("No store selected: route the request to a store or set COFFEE_STORE")
+    return store
+
+def store_ids():
+    """Every store, in COFFEE_STORES order ([None] for a single store)"""
+    return list(_stores)
+
+def current_store_id():
+    """Id of the store database calls go to (None for a single store)"""
+    return _store().id
+
+def select_store(store_id):
+    """Send this context's database calls to store_id; returns a token for reset_store()"""
+    if store_id not in _stores:
+        raise KeyError(f"Unknown store: {store_id}")
+    return _current_store.set(_stores[store_id])
+
+def reset_store(token):
+    _current_store.reset(token)
+
+@contextmanager
+def use_store(store_id):
+    """Run the enclosed database calls against store_id's database"""
+    token = select_store(store_id)
+    try:
+        yield
+    finally:
+        reset_store(token)
+
+def for_each_store(fn, *args):
+    """Call fn(*args) once per store, in parallel threads
+
+    Returns {store id: result}; the first exception raised is re-raised.
+    """
+    with ThreadPoolExecutor(max_workers=len(_stores), thread_name_prefix='store') as executor:
+        futures = {store_id: executor.submit(_call_in_store, store_id, fn, args) for store_id in _stores}
+    return {store_id: future.result() for store_id, future in futures.items()}
+
+def _call_in_store(store_id, fn, args):
+    with use_store(store_id):
+        try:
+            return fn(*args)
+        finally:
+            _stores[store_id].pool.release()
+
+def init_app(app):
+    """Bind the stores to a Flask app and create or migrate their databases"""
+    app.config.setdefault('DATABASE', DATABASE)
+    if not STORES and app.config['DATABASE'] != _stores[None].database:
+        close_connections()
+        _stores[None].pool.database = app.config['DATABASE']
+    app.teardown_appcontext(release_connection)
+    if STORES:
+        os.makedirs(STORE_DIR, exist_ok=True)
+    for store_id in _stores:
+        with use_store(store_id):
+            init_db()
+    if STORES:
+        _init_menu_db()
+        for store in _stores.values():
+            _sync_menu(store)
+
+def release_connection(exc=None):
+    """Hand this thread's connections back to the pools at app context teardown"""
+    for store in _stores.values():
+        store.pool.release()
+
+def get_db_connection():
+    """Return this thread's pooled connection to the current store's database"""
+    return _store().pool.acquire()
+
+def get_pool_stats():
+    """Get connection pool hit/miss counters"""
+    return _store().pool.stats()
+
+def get_writer_stats():
+    """Get write queue batching counters"""
+    return _store().writer.stats()
+
+def _init_menu_db():
+    """Create the shared menu file from the first store's seed menu"""
+    if os.path.exists(MENU_DATABASE):
+        return
+    seed = sqlite3.connect(_stores[STORES[0]].database)
+    create = seed.execute("SELECT sql FROM sqlite_master WHERE name = 'coffee_types'").fetchone()[0]
+    rows = seed.execute('SELECT * FROM coffee_types').fetchall()
+    seed.close()
+    # Built aside and renamed in, so a crash never leaves a half-made menu
+    building = MENU_DATABASE + '.new'
+    if os.path.exists(building):
+        os.remove(building)
+    conn = sqlite3.connect(building)
+    conn.execute(create)
+    if rows:
+        conn.executemany(f"INSERT INTO coffee_types VALUES ({', '.join('?' * len(rows[0]))})", rows)
+    conn.commit()
+    conn.close()
+    os.replace(building, MENU_DATABASE)
+    print(f"Created shared menu {MENU_DATABASE}")
+
+def _sync_menu(store):
+    """Copy the shared menu into store's coffee_types if it changed since last time
+
+    Order items, search triggers and reports join coffee_types inside the
+    store's own file, so each store keeps a replica; rows are only ever
+    upserted, as old orders still point at retired items.
+    """
+    if not STORES:
+        return
+    menu = _catalog.snapshot()
+    if menu.fingerprint != store.menu_fingerprint:
+        store.writer.run(_copy_menu, menu.items)
+        store.menu_fingerprint = menu.fingerprint
+
+def _copy_menu(conn, items):
+    """Upsert the menu rows (runs on the writer thread)"""
+    for item in items:
+        columns = list(item)
+        conn.execute(
+            f"INSERT INTO coffee_types ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns if c != 'id')}",
+            [item[c] for c in columns]
+        )
+
+def start_event_relay():
+    """Follow order changes made by other processes (multi-worker servers)"""
+    for store in _stores.values():
+        store.relay.start()
+
+def close_connections():
+    """Stop the writer and close every connection, e.g. before fork()
+
+    The menu snapshot stays in memory; everything reconnects on next use.
+    """
+    for store in _stores.values():
+        store.close()
+    _catalog.close()
+
 def database_exists():
     """Check if database file exists"""
-    return os.path.exists('coffee_orders.db')
+    return os.path.exists(_store().database)
 
 def tables_exist():
     """Check if all required tables exist"""
@@ -26,112 +687,564 @@ def tables_exist():
         conn.close()
 
 def init_db():
-    """Initialize the database only if it doesn't exist or tables are missing"""
+    """Create the database if needed and bring its schema up to date"""
     # Check if database file exists and tables are present
     if database_exists() and tables_exist():
         print("Database already exists. Skipping initialization.")
-        return
+    else:
+        print("Initializing database...")
+        conn = get_db_connection()
+        
+        # Read and execute schema
+        with open('schema.sql', 'r') as f:
+            conn.executescript(f.read())
+        
+        conn.commit()
+        conn.close()
+        print("Database initialized successfully!")
     
-    print("Initializing database...")
+    migrate()
+
+def get_migrations():
+    """List (version, name, path) for every migration script, in order"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        number, _, name = filename.partition('_')
+        if filename.endswith('.sql') and number.isdigit():
+            migrations.append((int(number), name[:-4], os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+def get_schema_version():
+    """Get the last migration applied to the database"""
     conn = get_db_connection()
-    
-    # Read and execute schema
-    with open('schema.sql', 'r') as f:
-        conn.executescript(f.read())
-    
-    conn.commit()
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
     conn.close()
-    print("Database initialized successfully!")
+    return version
+
+def migrate():
+    """Apply pending migrations in place, one transaction each
+
+    Returns the list of (version, name) applied.
+    """
+    applied = []
+    conn = connect(_store().database, isolation_level=None)
+    try:
+        for version, name, path in get_migrations():
+            with open(path, 'r') as f:
+                statements = _split_sql(f.read())
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Checked under the write lock in case another process
+                # is migrating the same file
+                if version <= conn.execute('PRAGMA user_version').fetchone()[0]:
+                    conn.execute('ROLLBACK')
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            print(f"Applied migration {version:04d} {name}")
+            applied.append((version, name))
+    finally:
+        conn.close()
+    return applied
+
+def _split_sql(script):
+    """Split a SQL script into single statements (triggers stay whole)"""
+    statements = []
+    pending = ''
+    for line in script.splitlines(keepends=True):
+        pending += line
+        if sqlite3.complete_statement(pending):
+            statements.append(pending.strip())
+            pending = ''
+    if pending.strip():
+        statements.append(pending.strip())  # trailing comments, or a typo SQLite will report
+    return statements
+
+def get_menu():
+    """Get the cached menu snapshot (see catalog.Menu)"""
+    return _catalog.snapshot()
+
+def invalidate_menu():
+    """Drop the cached menu after coffee_types was changed"""
+    _catalog.invalidate()
 
 def get_coffee_types():
     """Get all available coffee types"""
+    return _catalog.snapshot().items
+
+def get_coffee_type(coffee_type_id):
+    """Get a single coffee type by id, or None"""
+    return _catalog.get(coffee_type_id)
+
+def get_coffee_types_by_category():
+    """Get the coffee types still in stock, grouped by category"""
+    # Shared by every request; callers must treat it as read-only
+    return get_available_menu().by_category
+
+def get_available_menu():
+    """The menu snapshot without the items the current store has sold out of
+
+    Its fingerprint also covers the sold-out set, and its loaded_at is when
+    the menu or that set last changed, so pages, ETags and Last-Modified
+    all move the moment an item sells out or comes back.
+    """
+    store = _store()
+    menu = _catalog.snapshot()
+    sold_out = store.inventory.get_sold_out() & menu.by_id.keys()
+    changed_at = store.inventory.changed_at
+    if not sold_out and (changed_at is None or changed_at <= menu.loaded_at):
+        return menu
+    key = (menu.fingerprint, sold_out, changed_at)
+    cached = store.available_menu
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    items = [item for item in menu.items if item['id'] not in sold_out]
+    by_category = {}
+    for item in items:
+        by_category.setdefault(item['category'], []).append(item)
+    available = menu._replace(
+        fingerprint=f"{menu.fingerprint}-{'.'.join(map(str, sorted(sold_out)))}" if sold_out else menu.fingerprint,
+        loaded_at=max(menu.loaded_at, changed_at),
+        items=items,
+        by_id={item['id']: item for item in items},
+        by_category=by_category,
+    )
+    store.available_menu = (key, available)
+    return available
+
+class OutOfStock(ValueError):
+    """Raised by place_order() when the store cannot fill every line"""
+
+    def __init__(self, names):
+        super().__init__(f"Sold out: {', '.join(names)}")
+        self.names = names
+
+def get_stock(coffee_type_id):
+    """Units of an item left at the current store, or None if it is not tracked"""
+    return _store().inventory.available(coffee_type_id)
+
+def get_inventory():
+    """Every tracked item with its live count at the current store"""
+    inventory = _store().inventory
     conn = get_db_connection()
-    coffee_types = conn.execute('SELECT * FROM coffee_types ORDER BY category, name').fetchall()
+    rows = conn.execute('SELECT coffee_type_id FROM inventory ORDER BY coffee_type_id').fetchall()
     conn.close()
-    return coffee_types
+    menu = _catalog.snapshot()
+    return [{'id': row['coffee_type_id'],
+             'name': menu.by_id[row['coffee_type_id']]['name'] if row['coffee_type_id'] in menu.by_id else None,
+             'on_hand': inventory.available(row['coffee_type_id'])}
+            for row in rows]
 
-def get_coffee_types_by_category():
-    """Get coffee types grouped by category"""
+def get_inventory_stats():
+    """Get in-memory stock counters for the current store"""
+    return _store().inventory.stats()
+
+def set_stock(coffee_type_id, on_hand):
+    """Set an item's count at the current store after a delivery or stocktake
+
+    on_hand=None stops tracking the item. This process's unflushed sales are
+    written first, so the new count replaces them. Other processes (the
+    workers of a running `flask serve`, when this is `flask set-stock`)
+    apply their unflushed sales on top of the new count at their next
+    flush, so a count taken while they sell can come out low by up to
+    inventory.FLUSH_INTERVAL seconds of their sales.
+    """
+    if _catalog.get(coffee_type_id) is None:
+        raise ValueError(f"Invalid coffee type ID: {coffee_type_id}")
+    if on_hand is not None and on_hand < 0:
+        raise ValueError("Stock cannot be negative")
+    store = _store()
+    store.inventory.flush()
+    store.writer.run(_set_stock, coffee_type_id, on_hand)
+    store.inventory.flush()
+
+def _set_stock(conn, coffee_type_id, on_hand):
+    if on_hand is None:
+        conn.execute('DELETE FROM inventory WHERE coffee_type_id = ?', (coffee_type_id,))
+    else:
+        conn.execute(
+            'INSERT INTO inventory (coffee_type_id, on_hand) VALUES (?, ?) '
+            'ON CONFLICT (coffee_type_id) DO UPDATE SET on_hand = excluded.on_hand',
+            (coffee_type_id, on_hand)
+        )
+
+def _load_stock(store):
+    """{coffee_type_id: on_hand} for every tracked item of store"""
+    conn = store.pool.acquire()
+    rows = conn.execute('SELECT coffee_type_id, on_hand FROM inventory').fetchall()
+    store.pool.release()
+    return {row['coffee_type_id']: row['on_hand'] for row in rows}
+
+def _apply_stock_changes(conn, changes):
+    """Add a batch of {coffee_type_id: delta} to the stock (runs on the writer thread)"""
+    conn.executemany('UPDATE inventory SET on_hand = on_hand + ? WHERE coffee_type_id = ?',
+                     [(delta, coffee_type_id) for coffee_type_id, delta in changes.items()])
+
+def price_cart(cart, conn=None):
+    """Price a whole cart in one lookup
+
+    cart is a list of {'coffee_type_id', 'quantity'} dicts. With conn the
+    prices come from a single WHERE id IN (...) query on that connection,
+    otherwise from the menu catalog. Returns (lines, total); unknown ids
+    are left out of lines.
+    """
+    if not cart:
+        return [], 0
+
+    if conn is None:
+        coffee_types = _catalog.snapshot().by_id
+    else:
+        ids = list({item['coffee_type_id'] for item in cart})
+        placeholders = ','.join('?' * len(ids))
+        rows = conn.execute(f'SELECT * FROM coffee_types WHERE id IN ({placeholders})', ids).fetchall()
+        coffee_types = {row['id']: row for row in rows}
+
+    lines = []
+    total = 0
+    for item in cart:
+        coffee = coffee_types.get(item['coffee_type_id'])
+        if coffee is None:
+            continue
+        line_total = coffee['price'] * item['quantity']
+        lines.append({
+            'id': coffee['id'],
+            'name': coffee['name'],
+            'price': coffee['price'],
+            'quantity': item['quantity'],
+            'total': line_total,
+            'category': coffee['category']
+        })
+        total += line_total
+    return lines, total
+
+def place_order(customer_name, order_items, idempotency_key=None):
+    """Place a new order with multiple items
+
+    With an idempotency_key, a repeat of the call (a double-submit, a kiosk
+    retry) returns the id of the order the key placed first instead of
+    placing another; see get_idempotent_order() for the cheap pre-check.
+    """
+    store = _store()
+    # Price against the current shared menu
+    _sync_menu(store)
+    # Stock is taken in memory; the sale reaches the inventory table with
+    # the next batched flush, not in this order's transaction
+    quantities = {}
+    for item in order_items:
+        if item['quantity'] < 1:
+            raise ValueError(f"Invalid quantity for coffee type ID {item['coffee_type_id']}: {item['quantity']}")
+        quantities[item['coffee_type_id']] = quantities.get(item['coffee_type_id'], 0) + item['quantity']
+    short = store.inventory.reserve(quantities)
+    if short:
+        menu = _catalog.snapshot()
+        raise OutOfStock([menu.by_id[item]['name'] if item in menu.by_id else str(item) for item in short])
+    try:
+        if not idempotency_key:
+            order, event_id = store.writer.run(_insert_order, customer_name, order_items)
+        else:
+            order_id, order, event_id = store.writer.run(_insert_keyed_order, idempotency_key, customer_name, order_items)
+    except BaseException:
+        store.inventory.release(quantities)
+        raise
+    if order is None:
+        # A replay: the first request already took the stock
+        store.inventory.release(quantities)
+        return order_id
+    order_placed.send(order['id'], order=order, store=store.id, event_id=event_id)
+    return order['id']
+
+def get_idempotent_order(key):
+    """Id of the order an unexpired idempotency key placed, or None
+
+    None as well if that order has since been removed, so the retry places
+    a new one.
+    """
     conn = get_db_connection()
-    coffee_types = conn.execute('SELECT * FROM coffee_types ORDER BY category, name').fetchall()
+    row = conn.execute(IDEMPOTENCY_KEY_SQL, (key, f'-{IDEMPOTENCY_KEY_TTL_HOURS} hours')).fetchone()
     conn.close()
+    return row['order_id'] if row else None
+
+IDEMPOTENCY_KEY_SQL = '''
+    SELECT k.order_id FROM idempotency_keys k
+    JOIN orders o ON o.id = k.order_id
+    WHERE k.key = ? AND k.created_at >= datetime('now', ?)
+'''
+
+def _insert_keyed_order(conn, key, customer_name, order_items):
+    """Place an order unless key already did (runs on the writer thread)
+
+    Returns (order_id, summary, event_id); summary and event_id are None for
+    a replayed key. The writer runs one job at a time, so two racing submits
+    cannot both miss.
+    """
+    row = conn.execute(IDEMPOTENCY_KEY_SQL, (key, f'-{IDEMPOTENCY_KEY_TTL_HOURS} hours')).fetchone()
+    if row:
+        return row['order_id'], None, None
+    order, event_id = _insert_order(conn, customer_name, order_items)
+    # REPLACE: an expired key may still be on file until the next prune
+    rowid = conn.execute(
+        'INSERT OR REPLACE INTO idempotency_keys (key, order_id) VALUES (?, ?)', (key, order['id'])
+    ).lastrowid
+    if rowid % 100 == 0:
+        conn.execute("DELETE FROM idempotency_keys WHERE rowid <= ? OR created_at < datetime('now', ?)",
+                     (rowid - MAX_IDEMPOTENCY_KEYS, f'-{IDEMPOTENCY_KEY_TTL_HOURS} hours'))
+    return order['id'], order, event_id
+
+def _insert_order(conn, customer_name, order_items):
+    """Write an order and its items (runs on the writer thread)
+
+    Returns (summary, event_id).
+    """
+    # Price every line with one query so the totals match what we store
+    lines, total_amount = price_cart(order_items, conn)
+    if len(lines) != len(order_items):
+        priced = {line['id'] for line in lines}
+        missing = next(item['coffee_type_id'] for item in order_items if item['coffee_type_id'] not in priced)
+        raise ValueError(f"Invalid coffee type ID: {missing}")
+    
+    # Create order
+    order = conn.execute(
+        'INSERT INTO orders (customer_name, total_amount) VALUES (?, ?) RETURNING *',
+        (customer_name, total_amount)
+    ).fetchone()
+    order_id = order['id']
     
-    # Group by category
-    categories = {}
-    for item in coffee_types:
-        category = item['category']
-        if category not in categories:
-            categories[category] = []
-        categories[category].append(dict(item))
+    conn.executemany(
+        'INSERT INTO order_items (order_id, coffee_type_id, quantity, price) VALUES (?, ?, ?, ?)',
+        [(order_id, line['id'], line['quantity'], line['price']) for line in lines]
+    )
+    _add_to_rollups(conn, order, lines)
     
-    return categories
+    # Same shape as an /orders row, for the live order feed
+    summary = dict(order,
+                   items_description=','.join(f"{line['name']} (x{line['quantity']})" for line in lines),
+                   item_count=len(lines))
+    return summary, _log_event(conn, 'order', summary)
+
+# Upserts that add one group of sales to each rollup table
+ROLLUP_UPSERTS = {
+    'sales_daily': '''
+        INSERT INTO sales_daily (day, orders, items, revenue) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day) DO UPDATE SET orders = orders + excluded.orders,
+                                        items = items + excluded.items,
+                                        revenue = revenue + excluded.revenue
+    ''',
+    'sales_hourly': '''
+        INSERT INTO sales_hourly (day, hour, orders, revenue) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, hour) DO UPDATE SET orders = orders + excluded.orders,
+                                              revenue = revenue + excluded.revenue
+    ''',
+    'item_daily': '''
+        INSERT INTO item_daily (day, coffee_type_id, quantity, revenue) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, coffee_type_id) DO UPDATE SET quantity = quantity + excluded.quantity,
+                                                        revenue = revenue + excluded.revenue
+    ''',
+}
+
+# The same groups computed from an orders / order_items pair, for rebuilds,
+# over the orders o matching {where}
+ROLLUP_AGGREGATES = {
+    'sales_daily': '''
+        SELECT date(o.order_date), COUNT(*),
+               TOTAL((SELECT SUM(quantity) FROM order_items oi WHERE oi.order_id = o.id)),
+               TOTAL(o.total_amount)
+        FROM orders o
+        WHERE {where}
+        GROUP BY 1
+    ''',
+    'sales_hourly': '''
+        SELECT date(o.order_date), CAST(strftime('%H', o.order_date) AS INTEGER), COUNT(*), TOTAL(o.total_amount)
+        FROM orders o
+        WHERE {where}
+        GROUP BY 1, 2
+    ''',
+    'item_daily': '''
+        SELECT date(o.order_date), oi.coffee_type_id, SUM(oi.quantity), TOTAL(oi.quantity * oi.price)
+        FROM order_items oi
+        JOIN orders o ON o.id = oi.order_id
+        WHERE {where}
+        GROUP BY 1, 2
+    ''',
+}
+
+# Leading key columns of each rollup row; the rest are counts and sums
+ROLLUP_KEYS = {'sales_daily': 1, 'sales_hourly': 2, 'item_daily': 2}
+
+def _add_to_rollups(conn, order, lines):
+    """Count a new order in the sales rollups (same transaction as the order)"""
+    day, hour = order['order_date'][:10], int(order['order_date'][11:13])
+    revenue = order['total_amount']
+    conn.execute(ROLLUP_UPSERTS['sales_daily'], (day, 1, sum(line['quantity'] for line in lines), revenue))
+    conn.execute(ROLLUP_UPSERTS['sales_hourly'], (day, hour, 1, revenue))
+    conn.executemany(ROLLUP_UPSERTS['item_daily'],
+                     [(day, line['id'], line['quantity'], line['total']) for line in lines])
+
+def _remove_from_rollups(conn, where, params=()):
+    """Take the orders o matching where out of the sales rollups
+
+    Call it in the transaction that deletes them, before their items go.
+    """
+    for table, sql in ROLLUP_AGGREGATES.items():
+        keys = ROLLUP_KEYS[table]
+        conn.executemany(ROLLUP_UPSERTS[table],
+                         [tuple(row[:keys]) + tuple(-value for value in row[keys:])
+                          for row in conn.execute(sql.format(where=where), params)])
+    # Like a rebuild, keep no rows for days and items with no sales left
+    conn.execute('DELETE FROM sales_daily WHERE orders <= 0')
+    conn.execute('DELETE FROM sales_hourly WHERE orders <= 0')
+    conn.execute('DELETE FROM item_daily WHERE quantity <= 0')
 
-def place_order(customer_name, order_items):
-    """Place a new order with multiple items"""
+def advance_order(order_id, action):
+    """Apply a workflow action (see ORDER_ACTIONS) to an order
+
+    Returns the new status, or None if there is no such order. Raises
+    ValueError if the order is not in the status the action applies to.
+    """
+    if action not in ORDER_ACTIONS:
+        raise ValueError(f"Invalid order action: {action}")
+    from_status, to_status = ORDER_ACTIONS[action]
+    event_id = _store().writer.run(_update_order_status, order_id, from_status, to_status)
+    if event_id:
+        order_status_changed.send(order_id, status=to_status, store=current_store_id(), event_id=event_id)
+        return to_status
+    return None
+
+def _update_order_status(conn, order_id, from_status, to_status):
+    """Move an order between statuses (runs on the writer thread)
+
+    Returns the order_events id of the change, or None if there is no such order.
+    """
+    row = conn.execute('SELECT status FROM orders WHERE id = ?', (order_id,)).fetchone()
+    if row is None:
+        return None
+    if row['status'] != from_status:
+        raise ValueError(f"Order {order_id} is {row['status']}, not {from_status}")
+    conn.execute('UPDATE orders SET status = ? WHERE id = ?', (to_status, order_id))
+    return _log_event(conn, 'status', {'id': order_id, 'status': to_status})
+
+def _log_event(conn, kind, data):
+    """Record an order change in order_events, in the caller's transaction; returns its id"""
+    event_id = conn.execute(
+        'INSERT INTO order_events (pid, kind, data) VALUES (?, ?, ?)',
+        (os.getpid(), kind, json.dumps(data, separators=(',', ':')))
+    ).lastrowid
+    if event_id % 1000 == 0:
+        conn.execute('DELETE FROM order_events WHERE id <= ?', (event_id - EVENT_LOG_SIZE,))
+    return event_id
+
+def get_last_event_id():
+    """Id of the current store's newest order_events row (0 if there is none)"""
     conn = get_db_connection()
-    
+    event_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM order_events').fetchone()[0]
+    conn.close()
+    return event_id
+
+def get_open_orders():
+    """Get every order still in the workflow, oldest first"""
+    conn = get_db_connection()
+    rows = conn.execute(OPEN_ORDERS_SQL).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def remove_orders_by_customer(customer_name):
+    """Remove all orders (and their items) for a customer"""
+    order_ids, event_id = _store().writer.run(_delete_customer_orders, customer_name)
+    if order_ids:
+        orders_removed.send(order_ids, store=current_store_id(), event_id=event_id)
+    return len(order_ids)
+
+def _delete_customer_orders(conn, customer_name):
+    """Delete a customer's orders (runs on the writer thread)
+
+    Returns (order ids, order_events id); the event id is None if there were none.
+    """
+    _remove_from_rollups(conn, 'o.customer_name = ?', (customer_name,))
+    # First delete order items, then orders
+    conn.execute('DELETE FROM order_items WHERE order_id IN (SELECT id FROM orders WHERE customer_name = ?)', (customer_name,))
+    conn.execute('DELETE FROM idempotency_keys WHERE order_id IN (SELECT id FROM orders WHERE customer_name = ?)', (customer_name,))
+    rows = conn.execute('DELETE FROM orders WHERE customer_name = ? RETURNING id', (customer_name,)).fetchall()
+    order_ids = [row['id'] for row in rows]
+    if not order_ids:
+        return order_ids, None
+    return order_ids, _log_event(conn, 'removed', {'ids': order_ids})
+
+def count_orders(where, params=()):
+    """(orders, order items, total amount) matching an SQL condition on orders"""
+    conn = get_db_connection()
+    row = conn.execute(f'''
+        SELECT COUNT(*), TOTAL((SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = orders.id)), TOTAL(total_amount)
+        FROM orders WHERE {where}
+    ''', params).fetchone()
+    conn.close()
+    return int(row[0]), int(row[1]), round(row[2], 2)
+
+def delete_orders(where, params=(), chunk_size=DELETE_CHUNK_SIZE):
+    """Delete the orders matching an SQL condition, with their items
+
+    Works set-based, chunk_size orders per transaction, so a purge of
+    millions of rows never holds the write lock for long. Yields the ids
+    removed by each committed chunk. Archived orders are not touched.
+    """
+    store = current_store_id()
+    conn = connect(_store().database, isolation_level=None)
     try:
-        # Calculate total amount
-        total_amount = 0
-        for item in order_items:
-            coffee_type_id = item['coffee_type_id']
-            quantity = item['quantity']
-            
-            # Get coffee price
-            coffee = conn.execute(
-                'SELECT price FROM coffee_types WHERE id = ?', 
-                (coffee_type_id,)
-            ).fetchone()
-            
-            if coffee:
-                total_amount += coffee['price'] * quantity
-            else:
-                raise ValueError(f"Invalid coffee type ID: {coffee_type_id}")
-        
-        # Create order
-        cursor = conn.execute(
-            'INSERT INTO orders (customer_name, total_amount) VALUES (?, ?)',
-            (customer_name, total_amount)
-        )
-        order_id = cursor.lastrowid
-        
-        # Add order items
-        for item in order_items:
-            coffee_type_id = item['coffee_type_id']
-            quantity = item['quantity']
-            
-            # Get coffee price
-            coffee = conn.execute(
-                'SELECT price FROM coffee_types WHERE id = ?', 
-                (coffee_type_id,)
-            ).fetchone()
-            
-            conn.execute(
-                'INSERT INTO order_items (order_id, coffee_type_id, quantity, price) VALUES (?, ?, ?, ?)',
-                (order_id, coffee_type_id, quantity, coffee['price'])
-            )
-        
-        conn.commit()
-        return order_id
-        
-    except Exception as e:
-        conn.rollback()
-        raise e
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                ids = [row[0] for row in conn.execute(f'SELECT id FROM orders WHERE {where} LIMIT ?',
+                                                      tuple(params) + (chunk_size,))]
+                if ids:
+                    marks = ', '.join('?' * len(ids))
+                    _remove_from_rollups(conn, f'o.id IN ({marks})', ids)
+                    conn.execute(f'DELETE FROM order_items WHERE order_id IN ({marks})', ids)
+                    conn.execute(f'DELETE FROM idempotency_keys WHERE order_id IN ({marks})', ids)
+                    conn.execute(f'DELETE FROM orders WHERE id IN ({marks})', ids)
+                    event_id = _log_event(conn, 'removed', {'ids': ids})
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            if not ids:
+                break
+            orders_removed.send(ids, store=store, event_id=event_id)
+            yield ids
     finally:
         conn.close()
 
 def get_order_details(order_id):
-    """Get complete order details including items"""
+    """Get complete order details including items
+
+    Orders moved out by archive_orders() are read back from their archive
+    file.
+    """
     conn = get_db_connection()
-    
+    details = _order_details(conn, order_id)
+    archived = None
+    if details is None:
+        archived = conn.execute('SELECT month FROM archived_orders WHERE id = ?', (order_id,)).fetchone()
+    conn.close()
+
+    if archived is not None:
+        conn = _attach_archive(archived['month'])
+        if conn is not None:
+            details = _order_details(conn, order_id, 'archive')
+            conn.close()
+    return details
+
+def _order_details(conn, order_id, schema='main'):
+    """Order and item dicts for order_id from the orders tables in schema"""
     # Get order basic info
     order_result = conn.execute(
-        'SELECT * FROM orders WHERE id = ?', 
+        f'SELECT * FROM {schema}.orders WHERE id = ?', 
         (order_id,)
     ).fetchone()
     
     if not order_result:
-        conn.close()
         return None
     
     # Convert order to dictionary
@@ -144,10 +1257,10 @@ def get_order_details(order_id):
     }
     
     # Get order items with coffee details
-    items_result = conn.execute('''
+    items_result = conn.execute(f'''
         SELECT oi.*, ct.name as coffee_name, ct.category as category
-        FROM order_items oi 
-        JOIN coffee_types ct ON oi.coffee_type_id = ct.id 
+        FROM {schema}.order_items oi 
+        JOIN main.coffee_types ct ON oi.coffee_type_id = ct.id 
         WHERE oi.order_id = ?
     ''', (order_id,)).fetchall()
     
@@ -163,55 +1276,547 @@ def get_order_details(order_id):
             'category': row['category']
         })
     
-    conn.close()
-    
     return {
         'order': order,
         'items': items
     }
 
-def get_all_orders():
-    """Get all orders with item information"""
-    conn = get_db_connection()
-    
-    # Get all orders
-    orders_result = conn.execute('''
-        SELECT o.*, 
-               GROUP_CONCAT(ct.name || ' (x' || oi.quantity || ')') as items_description,
-               COUNT(oi.id) as item_count
-        FROM orders o 
-        LEFT JOIN order_items oi ON o.id = oi.order_id
-        LEFT JOIN coffee_types ct ON oi.coffee_type_id = ct.id
-        GROUP BY o.id
-        ORDER BY o.order_date DESC
-    ''').fetchall()
+def _order_item_columns(schema='main'):
+    """SELECT columns items_description and item_count for an orders row aliased o
+
+    Shared by the orders list, the open-orders index, search and exports,
+    so every screen describes an order the same way.
+    """
+    return f'''
+           (SELECT GROUP_CONCAT(ct.name || ' (x' || oi.quantity || ')')
+            FROM {schema}.order_items oi
+            JOIN main.coffee_types ct ON oi.coffee_type_id = ct.id
+            WHERE oi.order_id = o.id) as items_description,
+           (SELECT COUNT(*) FROM {schema}.order_items oi WHERE oi.order_id = o.id) as item_count'''
+
+ORDERS_PAGE_SQL = f'''
+    SELECT o.*,{_order_item_columns()}
+    FROM orders o
+    {{where}}
+    ORDER BY o.order_date DESC, o.id DESC
+    LIMIT ?
+'''
+
+# Answered from the partial index idx_orders_open. The statuses are inlined
+# as literals: the planner cannot match a partial index against parameters.
+OPEN_ORDERS_SQL = f'''
+    SELECT o.*,{_order_item_columns()}
+    FROM orders o
+    WHERE o.status IN ({{statuses}})
+    ORDER BY o.id
+'''.format(statuses=', '.join(f"'{status}'" for status in OPEN_STATUSES))
+
+def get_orders_page(before=None, page_size=ORDERS_PAGE_SIZE):
+    """Get one page of orders, newest first
+
+    before is the (order_date, id) of the last order on the previous page,
+    so each page is a range scan of idx_orders_date_id no matter how deep
+    into the history it is. Returns (orders, next_cursor); next_cursor is
+    None on the last page.
+    """
+    page_size = max(1, min(page_size, MAX_ORDERS_PAGE_SIZE))
+    where = ''
+    params = []
+    if before is not None:
+        where = 'WHERE (o.order_date, o.id) < (?, ?)'
+        params.extend(before)
     
-    # Convert to list of dictionaries
-    orders = []
-    for row in orders_result:
-        orders.append({
-            'id': row['id'],
-            'customer_name': row['customer_name'],
-            'order_date': row['order_date'],
-            'total_amount': row['total_amount'],
-            'status': row['status'],
-            'items_description': row['items_description'],
-            'item_count': row['item_count']
-        })
+    conn = get_db_connection()
+    # Fetch one extra row to find out whether there is another page
+    orders_result = conn.execute(
+        ORDERS_PAGE_SQL.format(where=where),
+        params + [page_size + 1]
+    ).fetchall()
+    conn.close()
     
+    orders = [dict(row) for row in orders_result[:page_size]]
+    next_cursor = None
+    if len(orders_result) > page_size:
+        next_cursor = (orders[-1]['order_date'], orders[-1]['id'])
+    return orders, next_cursor
+
+EXPORT_SQL = f'''
+    SELECT o.id, o.customer_name, o.order_date, o.status, o.total_amount,{_order_item_columns('{schema}')}
+    FROM {{schema}}.orders o
+    {{where}}
+    ORDER BY o.order_date, o.id
+'''
+
+def iter_orders(start=None, end=None, statuses=None, chunk_size=EXPORT_CHUNK_SIZE, archived=False):
+    """Yield every matching order, oldest first, in lists of chunk_size rows
+
+    start and end are inclusive YYYY-MM-DD dates. Rows come off one cursor
+    per database on a dedicated connection, so memory stays flat however
+    many orders match. With archived=True the monthly archives in the date
+    range are attached and read first, then the live orders.
+    """
+    conditions = []
+    params = []
+    if start:
+        conditions.append('o.order_date >= ?')
+        params.append(start)
+    if end:
+        conditions.append("o.order_date < date(?, '+1 day')")
+        params.append(end)
+    if statuses:
+        conditions.append(f"o.status IN ({', '.join('?' * len(statuses))})")
+        params.extend(statuses)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    # Not a pooled connection: a streaming response outlives the request
+    # teardown that would hand a pooled one back
+    conn = connect(_store().database, check_same_thread=False)
+    try:
+        months = []
+        if archived:
+            months = [month for month, _ in list_archives()
+                      if (not start or month >= start[:7]) and (not end or month <= end[:7])]
+        for month in months:
+            _attach(conn, month)
+            yield from _fetch_chunks(conn.execute(EXPORT_SQL.format(schema='archive', where=where), params), chunk_size)
+            conn.execute('DETACH DATABASE archive')
+        yield from _fetch_chunks(conn.execute(EXPORT_SQL.format(schema='main', where=where), params), chunk_size)
+    finally:
+        conn.close()
+
+def _fetch_chunks(cursor, chunk_size):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+SEARCH_SQL = f'''
+    SELECT o.*,{_order_item_columns()}
+    FROM (SELECT rowid, bm25(order_search, 10.0, 1.0) as score
+          FROM order_search
+          WHERE order_search MATCH ?
+          ORDER BY rowid DESC
+          LIMIT ?) s
+    JOIN orders o ON o.id = s.rowid
+    ORDER BY s.score, o.id DESC
+    LIMIT ?
+'''
+
+def search_orders(query, limit=SEARCH_RESULTS):
+    """Find orders by customer or item name, best matches first
+
+    Every word is matched as a prefix. If nothing matches, misspelled
+    words are swapped for the closest indexed terms and the search is run
+    again. Returns (orders, corrected query or None).
+    """
+    words = re.findall(r'\w+', query.lower())
+    if not words:
+        return [], None
+
+    conn = get_db_connection()
+    orders = _search(conn, [[word] for word in words], limit)
+    corrected = None
+    if not orders:
+        alternatives = [_close_terms(conn, word) for word in words]
+        if any(alternatives[i] != [word] for i, word in enumerate(words)):
+            orders = _search(conn, alternatives, limit)
+            corrected = ' '.join(terms[0] for terms in alternatives)
     conn.close()
-    return orders
+    return orders, corrected
+
+def _search(conn, alternatives, limit):
+    # One group per search word: any of its spellings, as a prefix
+    match = ' AND '.join(
+        '(' + ' OR '.join(f'"{term}"*' for term in terms) + ')' for terms in alternatives
+    )
+    return [dict(row) for row in conn.execute(SEARCH_SQL, (match, SEARCH_WINDOW, limit))]
+
+def _close_terms(conn, word):
+    """Indexed terms spelled like word (word itself if it is indexed)"""
+    # Candidates share the first letter, which keeps the vocabulary scan
+    # small. A ratio of SUGGEST_CUTOFF needs the shorter of the two words to
+    # be at least that fraction of their average length, so longer and
+    # shorter terms can never match and are not handed to difflib.
+    shortest = math.floor(len(word) * SUGGEST_CUTOFF / (2 - SUGGEST_CUTOFF))
+    longest = math.ceil(len(word) * (2 - SUGGEST_CUTOFF) / SUGGEST_CUTOFF)
+    candidates = [row[0] for row in conn.execute('''
+        SELECT term FROM order_search_terms
+        WHERE term >= ? AND term < ? AND length(term) BETWEEN ? AND ?
+        LIMIT ?
+    ''', (word[0], word[0] + '\uffff', shortest, longest, SUGGEST_CANDIDATES))]
+    if word in candidates:
+        return [word]
+    return difflib.get_close_matches(word, candidates, n=3, cutoff=SUGGEST_CUTOFF) or [word]
+
+def rebuild_search_index():
+    """Repopulate the order search index from orders and the current menu"""
+    return _store().writer.run(_rebuild_search_index)
+
+def _rebuild_search_index(conn):
+    """Rebuild order_search (runs on the writer thread)"""
+    conn.execute('DELETE FROM order_search')
+    conn.execute('''
+        INSERT INTO order_search (rowid, customer_name, items)
+        SELECT o.id, o.customer_name,
+               COALESCE((SELECT GROUP_CONCAT(ct.name, ' ')
+                         FROM order_items oi
+                         JOIN coffee_types ct ON oi.coffee_type_id = ct.id
+                         WHERE oi.order_id = o.id), '')
+        FROM orders o
+    ''')
+    conn.execute("INSERT INTO order_search (order_search) VALUES ('optimize')")
+    return conn.execute('SELECT COUNT(*) FROM order_search').fetchone()[0]
 
 def get_database_stats():
-    """Get database statistics"""
+    """Get database statistics from the trigger-maintained stats row"""
     conn = get_db_connection()
+    row = conn.execute(
+        'SELECT orders_count, order_items_count, total_revenue FROM stats WHERE id = 1'
+    ).fetchone()
+    conn.close()
     
-    stats = {
-        'coffee_types_count': conn.execute('SELECT COUNT(*) FROM coffee_types').fetchone()[0],
-        'orders_count': conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0],
-        'order_items_count': conn.execute('SELECT COUNT(*) FROM order_items').fetchone()[0],
-        'total_revenue': conn.execute('SELECT SUM(total_amount) FROM orders').fetchone()[0] or 0
+    return {
+        'coffee_types_count': len(_catalog.snapshot().items),
+        'orders_count': row['orders_count'],
+        'order_items_count': row['order_items_count'],
+        # Running sums of REAL amounts pick up float noise
+        'total_revenue': round(row['total_revenue'], 2)
     }
-    
+
+def reconcile_stats():
+    """Rebuild the stats counters from the orders tables
+
+    Returns (before, after) counter dicts so drift can be reported.
+    """
+    return _store().writer.run(_reconcile_stats)
+
+def get_sales_analytics(days=ANALYTICS_DAYS):
+    """Dashboard figures for the last days (None for all time), from the rollups only"""
+    since = ''
+    if days is not None:
+        since = (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()
+
+    conn = get_db_connection()
+    daily = [dict(row) for row in conn.execute(
+        'SELECT day, orders, items, revenue FROM sales_daily WHERE day >= ? ORDER BY day', (since,)
+    )]
+    hourly = dict.fromkeys(range(24), 0)
+    for row in conn.execute(
+        'SELECT hour, SUM(orders) as orders FROM sales_hourly WHERE day >= ? GROUP BY hour', (since,)
+    ):
+        hourly[row['hour']] = row['orders']
+    items = conn.execute('''
+        SELECT ct.name, ct.category, t.quantity, t.revenue
+        FROM (SELECT coffee_type_id, SUM(quantity) as quantity, TOTAL(revenue) as revenue
+              FROM item_daily WHERE day >= ? GROUP BY coffee_type_id) t
+        JOIN coffee_types ct ON ct.id = t.coffee_type_id
+        ORDER BY ct.category, t.quantity DESC, t.revenue DESC
+    ''', (since,)).fetchall()
+    conn.close()
+
+    top_items = {}
+    for row in items:
+        ranked = top_items.setdefault(row['category'], [])
+        if len(ranked) < TOP_ITEMS_PER_CATEGORY:
+            ranked.append({'name': row['name'], 'quantity': row['quantity'], 'revenue': round(row['revenue'], 2)})
+    for day in daily:
+        day['revenue'] = round(day['revenue'], 2)
+    return {
+        'daily': daily,
+        'hourly': hourly,
+        'top_items': top_items,
+        'orders': sum(day['orders'] for day in daily),
+        'revenue': round(sum(day['revenue'] for day in daily), 2),
+    }
+
+def get_sales_by_store(days=ANALYTICS_DAYS):
+    """get_sales_analytics() of every store, queried in parallel, plus the chain-wide totals
+
+    Returns ({store id: figures}, merged figures); the merged top items are
+    re-ranked from the stores' own top items.
+    """
+    stores = for_each_store(get_sales_analytics, days)
+    daily = {}
+    hourly = dict.fromkeys(range(24), 0)
+    items = {}
+    for sales in stores.values():
+        for day in sales['daily']:
+            total = daily.setdefault(day['day'], {'day': day['day'], 'orders': 0, 'items': 0, 'revenue': 0})
+            for key in ('orders', 'items', 'revenue'):
+                total[key] += day[key]
+        for hour, orders in sales['hourly'].items():
+            hourly[hour] += orders
+        for category, ranked in sales['top_items'].items():
+            for item in ranked:
+                total = items.setdefault((category, item['name']), {'name': item['name'], 'quantity': 0, 'revenue': 0})
+                total['quantity'] += item['quantity']
+                total['revenue'] += item['revenue']
+
+    top_items = {}
+    for (category, _), item in sorted(items.items(), key=lambda entry: (entry[0][0], -entry[1]['quantity'], -entry[1]['revenue'])):
+        ranked = top_items.setdefault(category, [])
+        if len(ranked) < TOP_ITEMS_PER_CATEGORY:
+            ranked.append(dict(item, revenue=round(item['revenue'], 2)))
+    daily = [dict(day, revenue=round(day['revenue'], 2)) for _, day in sorted(daily.items())]
+    return stores, {
+        'daily': daily,
+        'hourly': hourly,
+        'top_items': top_items,
+        'orders': sum(day['orders'] for day in daily),
+        'revenue': round(sum(day['revenue'] for day in daily), 2),
+    }
+
+def rebuild_sales_rollups():
+    """Recompute the sales rollups from the live and archived orders
+
+    Returns the number of (daily, hourly, item) rollup rows written. Run it
+    while no archive_orders() job is moving orders, or a batch caught
+    between the two files is counted twice.
+    """
+    archived = {table: [] for table in ROLLUP_AGGREGATES}
+    for month, path in list_archives():
+        # Plain connection: connect() would switch the archive to WAL
+        conn = sqlite3.connect(path)
+        for table, sql in ROLLUP_AGGREGATES.items():
+            archived[table].extend(conn.execute(sql.format(where='1')))
+        conn.close()
+    return _store().writer.run(_rebuild_sales_rollups, archived)
+
+def _rebuild_sales_rollups(conn, archived):
+    """Rebuild the sales rollups (runs on the writer thread)"""
+    counts = []
+    for table, sql in ROLLUP_AGGREGATES.items():
+        conn.execute(f'DELETE FROM {table}')
+        conn.executemany(ROLLUP_UPSERTS[table], conn.execute(sql.format(where='1')).fetchall() + archived[table])
+        counts.append(conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0])
+    return tuple(counts)
+
+# Tables of a monthly archive file. Ids are kept, and AUTOINCREMENT on the
+# live tables means they are never handed out again.
+ARCHIVE_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS archive.orders (
+        id INTEGER PRIMARY KEY,
+        customer_name TEXT NOT NULL,
+        order_date TIMESTAMP,
+        total_amount REAL NOT NULL,
+        status TEXT
+    )''',
+    '''CREATE TABLE IF NOT EXISTS archive.order_items (
+        id INTEGER PRIMARY KEY,
+        order_id INTEGER NOT NULL,
+        coffee_type_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        price REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS archive.idx_orders_date_id ON orders (order_date, id)',
+    'CREATE INDEX IF NOT EXISTS archive.idx_order_items_order ON order_items (order_id)',
+]
+
+def archive_path(month):
+    return os.path.join(_store().archive_dir, f'orders-{month}.db')
+
+def list_archives():
+    """(month, path) for every archive file, oldest first"""
+    archive_dir = _store().archive_dir
+    if not os.path.isdir(archive_dir):
+        return []
+    months = sorted(name[7:14] for name in os.listdir(archive_dir)
+                    if name.startswith('orders-') and name.endswith('.db') and len(name) == 17)
+    return [(month, archive_path(month)) for month in months]
+
+def _attach(conn, month):
+    conn.execute('ATTACH DATABASE ? AS archive', (archive_path(month),))
+
+def _attach_archive(month):
+    """New connection with month's archive attached as 'archive', or None if the file is gone"""
+    if not os.path.exists(archive_path(month)):
+        return None
+    conn = connect(_store().database)
+    _attach(conn, month)
+    return conn
+
+def archive_orders(older_than_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move closed orders older than older_than_days into monthly archive files
+
+    Each batch is copied into its archive file and committed there first,
+    then recorded in archived_orders and deleted from the live tables in a
+    second transaction, so a crash in between leaves a duplicate that the
+    next run overwrites, never a lost order. The stats row and the sales
+    rollups keep counting archived orders. Returns {month: orders moved}.
+    """
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).strftime('%Y-%m-%d %H:%M:%S')
+    os.makedirs(_store().archive_dir, exist_ok=True)
+    open_statuses = ', '.join(f"'{status}'" for status in OPEN_STATUSES)
+    moved = {}
+    conn = connect(_store().database, isolation_level=None)
+    try:
+        while True:
+            batch = conn.execute(f'''
+                SELECT id, strftime('%Y-%m', order_date) as month FROM orders
+                WHERE order_date < ? AND status NOT IN ({open_statuses})
+                ORDER BY order_date, id
+                LIMIT ?
+            ''', (cutoff, batch_size)).fetchall()
+            if not batch:
+                break
+
+            by_month = {}
+            for row in batch:
+                by_month.setdefault(row['month'], []).append(row['id'])
+            for month, ids in by_month.items():
+                _copy_to_archive(conn, month, ids)
+
+            ids = [row['id'] for row in batch]
+            marks = ', '.join('?' * len(ids))
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO archived_orders (id, month, item_count, total_amount)
+                    SELECT o.id, strftime('%Y-%m', o.order_date),
+                           (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id),
+                           o.total_amount
+                    FROM orders o WHERE o.id IN ({marks})
+                ''', ids)
+                totals = conn.execute(f'''
+                    SELECT COUNT(*), TOTAL(item_count), TOTAL(total_amount)
+                    FROM archived_orders WHERE id IN ({marks})
+                ''', ids).fetchone()
+                conn.execute(f'DELETE FROM order_items WHERE order_id IN ({marks})', ids)
+                conn.execute(f'DELETE FROM orders WHERE id IN ({marks})', ids)
+                # Put back what the delete triggers took off the stats row
+                conn.execute('''
+                    UPDATE stats SET orders_count = orders_count + ?,
+                                     order_items_count = order_items_count + ?,
+                                     total_revenue = total_revenue + ?
+                    WHERE id = 1
+                ''', tuple(totals))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            for month, month_ids in by_month.items():
+                moved[month] = moved.get(month, 0) + len(month_ids)
+    finally:
+        conn.close()
+    return moved
+
+def vacuum():
+    """Rebuild the live database file to hand freed pages back to the OS"""
+    conn = connect(_store().database, isolation_level=None)
+    conn.execute('VACUUM')
+    conn.close()
+
+def _copy_to_archive(conn, month, ids):
+    """Copy orders and their items into month's archive file and commit there"""
+    marks = ', '.join('?' * len(ids))
+    _attach(conn, month)
+    try:
+        conn.execute('BEGIN')
+        try:
+            for statement in ARCHIVE_SCHEMA:
+                conn.execute(statement)
+            conn.execute(f'''
+                INSERT OR REPLACE INTO archive.orders (id, customer_name, order_date, total_amount, status)
+                SELECT id, customer_name, order_date, total_amount, status FROM main.orders WHERE id IN ({marks})
+            ''', ids)
+            conn.execute(f'''
+                INSERT OR REPLACE INTO archive.order_items (id, order_id, coffee_type_id, quantity, price)
+                SELECT id, order_id, coffee_type_id, quantity, price FROM main.order_items WHERE order_id IN ({marks})
+            ''', ids)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.execute('DETACH DATABASE archive')
+
+# Queries on the request path that must be answered from an index.
+# check_query_plans() flags any of them that would scan a whole table.
+HOT_QUERIES = {
+    'order by id': ('SELECT * FROM orders WHERE id = ?', (1,)),
+    'order items': ('''
+        SELECT oi.*, ct.name as coffee_name, ct.category as category
+        FROM order_items oi
+        JOIN coffee_types ct ON oi.coffee_type_id = ct.id
+        WHERE oi.order_id = ?
+    ''', (1,)),
+    'orders first page': (ORDERS_PAGE_SQL.format(where=''), (21,)),
+    'orders next page': (ORDERS_PAGE_SQL.format(where='WHERE (o.order_date, o.id) < (?, ?)'), ('2025-01-01 00:00:00', 1, 21)),
+    'open orders': (OPEN_ORDERS_SQL, ()),
+    'archived order by id': ('SELECT month FROM archived_orders WHERE id = ?', (1,)),
+    'sales by day': ('SELECT day, orders, items, revenue FROM sales_daily WHERE day >= ? ORDER BY day', ('2025-01-01',)),
+    'sales by item': ('SELECT coffee_type_id, SUM(quantity) FROM item_daily WHERE day >= ? GROUP BY coffee_type_id', ('2025-01-01',)),
+    'idempotency key': (IDEMPOTENCY_KEY_SQL, ('key', '-24 hours')),
+    'cart prices': ('SELECT * FROM coffee_types WHERE id IN (?, ?)', (1, 2)),
+    'delete items by customer': ('DELETE FROM order_items WHERE order_id IN (SELECT id FROM orders WHERE customer_name = ?)', ('',)),
+    'delete keys by customer': ('DELETE FROM idempotency_keys WHERE order_id IN (SELECT id FROM orders WHERE customer_name = ?)', ('',)),
+    'delete orders by customer': ('DELETE FROM orders WHERE customer_name = ?', ('',)),
+}
+
+def check_query_plans():
+    """EXPLAIN QUERY PLAN every hot query
+
+    Returns (name, plan detail) for each full table scan found; an empty
+    list means every hot query is index-backed.
+    """
+    # Fresh connection: a pooled one may still hold the pre-migration schema
+    conn = connect(_store().database)
+    problems = []
+    for name, (sql, params) in HOT_QUERIES.items():
+        for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params):
+            detail = row['detail']
+            # "SCAN t USING [COVERING] INDEX" is an ordered index walk
+            # bounded by LIMIT; a bare "SCAN t" reads the whole table
+            if detail.startswith('SCAN ') and ' USING ' not in detail and detail != 'SCAN CONSTANT ROW':
+                problems.append((name, detail))
     conn.close()
-    return stats
\ No newline at end of file
+    return problems
+
+def _reconcile_stats(conn):
+    """Recount the stats row (runs on the writer thread)"""
+    columns = 'orders_count, order_items_count, total_revenue'
+    before = dict(conn.execute(f'SELECT {columns} FROM stats WHERE id = 1').fetchone())
+    conn.execute('''
+        INSERT OR REPLACE INTO stats (id, orders_count, order_items_count, total_revenue)
+        SELECT 1,
+               (SELECT COUNT(*) FROM orders) + (SELECT COUNT(*) FROM archived_orders),
+               (SELECT COUNT(*) FROM order_items) + (SELECT TOTAL(item_count) FROM archived_orders),
+               (SELECT TOTAL(total_amount) FROM orders) + (SELECT TOTAL(total_amount) FROM archived_orders)
+    ''')
+    after = dict(conn.execute(f'SELECT {columns} FROM stats WHERE id = 1').fetchone())
+    return before, after
+
+def load_session(sid):
+    """Get (data, expires_at) for a live server-side session, or None"""
+    conn = get_db_connection()
+    row = conn.execute(
+        'SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?',
+        (sid, time.time())
+    ).fetchone()
+    conn.close()
+    return tuple(row) if row else None
+
+def save_session(sid, data, expires_at):
+    """Store a server-side session"""
+    _store().writer.run(_save_session, sid, data, expires_at)
+
+def _save_session(conn, sid, data, expires_at):
+    conn.execute(
+        'INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)',
+        (sid, data, expires_at)
+    )
+
+def delete_session(sid):
+    """Drop a server-side session"""
+    _store().writer.run(_delete_session, sid)
+
+def _delete_session(conn, sid):
+    conn.execute('DELETE FROM sessions WHERE id = ?', (sid,))
+
+def purge_expired_sessions():
+    """Queue removal of expired server-side sessions (does not wait)"""
+    return _store().writer.submit(_purge_expired_sessions, time.time())
+
+def _purge_expired_sessions(conn, now):
+    return conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,)).rowcount
@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import database as db
+
+EXPORT_FIELDS = ['id', 'customer_name', 'order_date', 'status', 'total_amount', 'item_count', 'items_description']
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+def parse_filters(start=None, end=None, status=None):
+    """Validate export filters; status is a comma-separated list
+
+    Returns (start, end, statuses) or raises ValueError.
+    """
+    for value in (start, end):
+        if value:
+            datetime.strptime(value, '%Y-%m-%d')
+    statuses = [s.strip() for s in status.split(',') if s.strip()] if status else []
+    for s in statuses:
+        if s not in db.ORDER_STATUSES:
+            raise ValueError(f'Unknown status: {s}')
+    return start or None, end or None, statuses
+
+def csv_chunks(chunks):
+    """Header, then one CSV text block per chunk of rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def ndjson_chunks(chunks):
+    """One JSON object per line, one text block per chunk of rows"""
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(EXPORT_FIELDS, row)), separators=(',', ':')) + '\n' for row in rows)
+
+FORMATTERS = {
+    'csv': csv_chunks,
+    'ndjson': ndjson_chunks,
+}
+
+def export_orders(fmt, start=None, end=None, statuses=None, archived=False):
+    """Generate the text of an order export in fmt, chunk by chunk"""
+    return FORMATTERS[fmt](db.iter_orders(start, end, statuses, archived=archived))
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+
+# Seconds between flushes of the in-memory stock changes to SQLite. The same
+# pass reloads the counts, picking up other workers' sales and restocks.
+FLUSH_INTERVAL = 2
+
+class Inventory:
+    """In-memory stock counters for one store, written back in batches
+
+    Only items with an inventory row are tracked; anything else never sells
+    out. reserve() takes stock for a whole order under one lock, so two
+    checkouts cannot both get the last croissant, and records the change as
+    a pending delta. A background thread hands the deltas to flush() as one
+    write every FLUSH_INTERVAL, then reloads the counts, so checkout itself
+    adds no write transaction. Deltas are relative, which keeps the table
+    right with several worker processes; between flushes each worker only
+    sees its own sales, so the last few units can oversell by what the
+    other workers sold in that window (the count goes negative and the
+    item shows as sold out).
+    """
+
+    def __init__(self, load, flush, interval=FLUSH_INTERVAL):
+        self._load = load      # () -> {coffee_type_id: on_hand}
+        self._flush = flush    # ({coffee_type_id: delta}) -> None, committed
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counts = None
+        self._pending = {}
+        self._pid = None
+        self._stopping = None
+        self.sold_out = frozenset()
+        # When sold_out last changed (time.time()), for Last-Modified headers
+        self.changed_at = None
+        self.reservations = self.rejections = self.flushes = 0
+
+    def _ensure_loaded(self):
+        # Called with self._lock held
+        if self._counts is not None and self._pid == os.getpid():
+            return
+        # First use, or we are a forked child: the parent flushed before fork()
+        self._counts = self._load()
+        self._pending = {}
+        self._pid = os.getpid()
+        self._update_sold_out()
+        self._stopping = threading.Event()
+        threading.Thread(target=self._loop, args=(self._stopping,),
+                         name='db-inventory', daemon=True).start()
+
+    def _update_sold_out(self):
+        sold_out = frozenset(item for item, count in self._counts.items() if count <= 0)
+        if sold_out != self.sold_out:
+            self.sold_out = sold_out
+            self.changed_at = time.time()
+
+    def get_sold_out(self):
+        """Ids of the tracked items with no stock left"""
+        if self._counts is None or self._pid != os.getpid():
+            with self._lock:
+                self._ensure_loaded()
+        return self.sold_out
+
+    def available(self, coffee_type_id):
+        """Units left of one item, or None if it is not tracked"""
+        with self._lock:
+            self._ensure_loaded()
+            return self._counts.get(coffee_type_id)
+
+    def reserve(self, quantities):
+        """Take {coffee_type_id: quantity} from stock, all or nothing
+
+        Returns the ids there is not enough of; nothing is taken unless
+        that list is empty. Quantities below 1 raise ValueError, as they
+        would add stock.
+        """
+        if any(quantity < 1 for quantity in quantities.values()):
+            raise ValueError("Quantity must be at least 1")
+        with self._lock:
+            self._ensure_loaded()
+            counts = self._counts
+            short = [item for item, quantity in quantities.items()
+                     if item in counts and counts[item] < quantity]
+            if short:
+                self.rejections += 1
+                return short
+            for item, quantity in quantities.items():
+                if item in counts:
+                    counts[item] -= quantity
+                    self._pending[item] = self._pending.get(item, 0) - quantity
+            self.reservations += 1
+            self._update_sold_out()
+            return []
+
+    def release(self, quantities):
+        """Put back stock taken by reserve() for an order that was not placed"""
+        with self._lock:
+            self._ensure_loaded()
+            for item, quantity in quantities.items():
+                if item in self._counts:
+                    self._counts[item] += quantity
+                    self._pending[item] = self._pending.get(item, 0) + quantity
+            self._update_sold_out()
+
+    def flush(self):
+        """Write the pending changes in one batch and reload the counts"""
+        with self._flush_lock:
+            with self._lock:
+                if self._pid != os.getpid():
+                    return
+                pending, self._pending = self._pending, {}
+            pending = {item: delta for item, delta in pending.items() if delta}
+            if pending:
+                try:
+                    self._flush(pending)
+                except BaseException:
+                    with self._lock:
+                        for item, delta in pending.items():
+                            self._pending[item] = self._pending.get(item, 0) + delta
+                    raise
+            counts = self._load()
+            with self._lock:
+                # Sales made since the swap are not on disk yet
+                for item, delta in self._pending.items():
+                    if item in counts:
+                        counts[item] += delta
+                self._counts = counts
+                self._update_sold_out()
+                self.flushes += bool(pending)
+
+    def _loop(self, stopping):
+        while not stopping.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                pass  # the deltas stay pending for the next pass
+
+    def close(self):
+        """Flush and stop the background thread, e.g. before fork()"""
+        with self._lock:
+            if self._counts is None or self._pid != os.getpid():
+                return
+            self._stopping.set()
+        self.flush()
+        with self._lock:
+            self._counts = None
+
+    def stats(self):
+        with self._lock:
+            return {'tracked': len(self._counts or ()), 'sold_out': len(self.sold_out),
+                    'pending': len(self._pending), 'reservations': self.reservations,
+                    'rejections': self.rejections, 'flushes': self.flushes}
@@ -0,0 +1,2 @@
+-- Keyset pagination of /orders walks this index newest first
+CREATE INDEX IF NOT EXISTS idx_orders_date_id ON orders (order_date, id);
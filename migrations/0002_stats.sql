@@ -0,0 +1,46 @@
+-- Running totals behind get_database_stats(). Triggers keep the single row
+-- current so the home page reads counters instead of scanning orders and
+-- order_items. `flask reconcile-stats` rebuilds the counters from scratch
+-- if they ever drift.
+CREATE TABLE IF NOT EXISTS stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    orders_count INTEGER NOT NULL DEFAULT 0,
+    order_items_count INTEGER NOT NULL DEFAULT 0,
+    total_revenue REAL NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO stats (id, orders_count, order_items_count, total_revenue)
+SELECT 1,
+       (SELECT COUNT(*) FROM orders),
+       (SELECT COUNT(*) FROM order_items),
+       (SELECT TOTAL(total_amount) FROM orders);
+
+CREATE TRIGGER IF NOT EXISTS stats_orders_insert AFTER INSERT ON orders
+BEGIN
+    UPDATE stats SET orders_count = orders_count + 1,
+                     total_revenue = total_revenue + NEW.total_amount
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_orders_delete AFTER DELETE ON orders
+BEGIN
+    UPDATE stats SET orders_count = orders_count - 1,
+                     total_revenue = total_revenue - OLD.total_amount
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_orders_update AFTER UPDATE OF total_amount ON orders
+BEGIN
+    UPDATE stats SET total_revenue = total_revenue - OLD.total_amount + NEW.total_amount
+    WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_order_items_insert AFTER INSERT ON order_items
+BEGIN
+    UPDATE stats SET order_items_count = order_items_count + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS stats_order_items_delete AFTER DELETE ON order_items
+BEGIN
+    UPDATE stats SET order_items_count = order_items_count - 1 WHERE id = 1;
+END;
@@ -0,0 +1,7 @@
+-- Covers the order_items side of get_order_details, the /orders item
+-- summaries and the delete paths without touching the table itself.
+CREATE INDEX IF NOT EXISTS idx_order_items_order
+    ON order_items (order_id, coffee_type_id, quantity, price);
+
+-- /admin/remove_order and remove_order.py look orders up by customer
+CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders (customer_name);
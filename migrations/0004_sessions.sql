@@ -0,0 +1,9 @@
+-- Server-side session store (SESSION_BACKEND = 'sqlite'). The cookie only
+-- carries the id; data is the JSON-encoded session dict.
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
@@ -0,0 +1,6 @@
+-- Orders still in the barista workflow. The open-orders index is rebuilt
+-- from this, so startup reads O(open orders) rather than the history. The
+-- WHERE clause must match OPEN_STATUSES in database.py for the planner to
+-- use it.
+CREATE INDEX IF NOT EXISTS idx_orders_open ON orders (id)
+    WHERE status IN ('pending', 'accepted', 'preparing', 'ready');
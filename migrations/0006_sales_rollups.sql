@@ -0,0 +1,44 @@
+-- Sales rollups behind /admin/analytics. place_order() adds to them in the
+-- same transaction as the order, so the dashboard never groups over orders
+-- or order_items. Days and hours are UTC, like order_date.
+-- `flask backfill-analytics` rebuilds them from the orders on file.
+CREATE TABLE IF NOT EXISTS sales_daily (
+    day TEXT PRIMARY KEY,
+    orders INTEGER NOT NULL DEFAULT 0,
+    items INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sales_hourly (
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    orders INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, hour)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS item_daily (
+    day TEXT NOT NULL,
+    coffee_type_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, coffee_type_id)
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO sales_daily (day, orders, items, revenue)
+SELECT date(o.order_date), COUNT(*),
+       TOTAL((SELECT SUM(quantity) FROM order_items oi WHERE oi.order_id = o.id)),
+       TOTAL(o.total_amount)
+FROM orders o
+GROUP BY date(o.order_date);
+
+INSERT OR IGNORE INTO sales_hourly (day, hour, orders, revenue)
+SELECT date(order_date), CAST(strftime('%H', order_date) AS INTEGER), COUNT(*), TOTAL(total_amount)
+FROM orders
+GROUP BY 1, 2;
+
+INSERT OR IGNORE INTO item_daily (day, coffee_type_id, quantity, revenue)
+SELECT date(o.order_date), oi.coffee_type_id, SUM(oi.quantity), TOTAL(oi.quantity * oi.price)
+FROM order_items oi
+JOIN orders o ON o.id = oi.order_id
+GROUP BY 1, 2;
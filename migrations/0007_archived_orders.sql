@@ -0,0 +1,10 @@
+-- Orders moved to monthly archive files by `flask archive-orders`. The month
+-- names the file (archive/orders-YYYY-MM.db) that get_order_details() attaches
+-- for an id no longer in orders. item_count and total_amount let
+-- reconcile-stats keep counting archived orders.
+CREATE TABLE IF NOT EXISTS archived_orders (
+    id INTEGER PRIMARY KEY,
+    month TEXT NOT NULL,
+    item_count INTEGER NOT NULL,
+    total_amount REAL NOT NULL
+);
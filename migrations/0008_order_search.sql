@@ -0,0 +1,45 @@
+-- Full-text search over orders for /orders/search: one row per live order
+-- (rowid = orders.id) holding the customer name and the names of the items.
+-- Diacritics are folded so "acai" finds "Açai"; 2 and 3 letter prefix
+-- indexes keep "sa*"-style lookups cheap. order_items rows are only ever
+-- deleted together with their order, so only the orders delete needs a
+-- trigger. `flask rebuild-search` repopulates it after menu renames.
+CREATE VIRTUAL TABLE IF NOT EXISTS order_search USING fts5(
+    customer_name,
+    items,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- Term list, for suggesting corrections to misspelled search words
+CREATE VIRTUAL TABLE IF NOT EXISTS order_search_terms USING fts5vocab(order_search, 'row');
+
+INSERT INTO order_search (rowid, customer_name, items)
+SELECT o.id, o.customer_name,
+       COALESCE((SELECT GROUP_CONCAT(ct.name, ' ')
+                 FROM order_items oi
+                 JOIN coffee_types ct ON oi.coffee_type_id = ct.id
+                 WHERE oi.order_id = o.id), '')
+FROM orders o;
+
+CREATE TRIGGER IF NOT EXISTS order_search_insert AFTER INSERT ON orders
+BEGIN
+    INSERT INTO order_search (rowid, customer_name, items) VALUES (NEW.id, NEW.customer_name, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_search_update AFTER UPDATE OF customer_name ON orders
+BEGIN
+    UPDATE order_search SET customer_name = NEW.customer_name WHERE rowid = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_search_delete AFTER DELETE ON orders
+BEGIN
+    DELETE FROM order_search WHERE rowid = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS order_search_item_insert AFTER INSERT ON order_items
+BEGIN
+    UPDATE order_search
+    SET items = ltrim(items || ' ' || COALESCE((SELECT name FROM coffee_types WHERE id = NEW.coffee_type_id), ''))
+    WHERE rowid = NEW.order_id;
+END;
@@ -0,0 +1,10 @@
+-- Outbox of committed order changes. Every worker process tails it, so an
+-- order placed or moved on one worker reaches the SSE screens and the
+-- open-orders index of all the others (and picks up remove_order.py runs).
+-- Only the most recent EVENT_LOG_SIZE rows are kept.
+CREATE TABLE IF NOT EXISTS order_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pid INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL
+);
@@ -0,0 +1,11 @@
+-- Checkout idempotency keys: a repeated submit with the same key (double
+-- tap, kiosk retry after a timeout) gets the order it placed the first time
+-- instead of a duplicate. Keys expire after IDEMPOTENCY_KEY_TTL_HOURS and
+-- at most MAX_IDEMPOTENCY_KEYS are kept; the writer prunes both.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    order_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created ON idempotency_keys (created_at);
@@ -0,0 +1,8 @@
+-- Stock on hand per item at this store. Items without a row are not
+-- tracked and never sell out; set counts with `flask set-stock`. The app
+-- keeps the live counts in memory (inventory.Inventory) and writes the
+-- changes back here in batches.
+CREATE TABLE IF NOT EXISTS inventory (
+    coffee_type_id INTEGER PRIMARY KEY REFERENCES coffee_types (id),
+    on_hand INTEGER NOT NULL
+);
@@ -0,0 +1,4 @@
+-- Lets order deletes drop the idempotency keys of the orders they remove,
+-- so a later retry with such a key places a new order instead of
+-- replaying one that is gone.
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_order ON idempotency_keys (order_id);
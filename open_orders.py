@@ -0,0 +1,79 @@
+import threading
+import time
+
+import database as db
+
+# Seconds before the index is rebuilt from SQLite anyway, to pick up
+# status changes made by other worker processes or the maintenance CLI
+RESYNC_INTERVAL = 10
+
+class OpenOrdersIndex:
+    """In-memory index of the orders still in the barista workflow
+
+    Rebuilt from the idx_orders_open partial index, then kept current from
+    the database order signals, so the open tickets view costs
+    O(open orders) no matter how long the order history is. Each store
+    has its own index; calls use the current store (db.current_store_id()).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._orders = {}
+        self._synced = {}
+
+    def rebuild(self):
+        store = db.current_store_id()
+        orders = {order['id']: order for order in db.get_open_orders()}
+        with self._lock:
+            self._orders[store] = orders
+            self._synced[store] = time.monotonic()
+
+    def snapshot(self):
+        """Open orders, oldest first"""
+        store = db.current_store_id()
+        synced = self._synced.get(store)
+        if synced is None or time.monotonic() - synced > RESYNC_INTERVAL:
+            self.rebuild()
+        with self._lock:
+            orders = self._orders[store]
+            return [orders[order_id] for order_id in sorted(orders)]
+
+    def counts(self):
+        """Number of open orders per status"""
+        counts = dict.fromkeys(db.OPEN_STATUSES, 0)
+        for order in self.snapshot():
+            counts[order['status']] += 1
+        return counts
+
+    def connect_signals(self):
+        """Follow the database order signals"""
+        db.order_placed.connect(self._on_order_placed, weak=False)
+        db.order_status_changed.connect(self._on_status_changed, weak=False)
+        db.orders_removed.connect(self._on_orders_removed, weak=False)
+
+    # A store not indexed yet is skipped; its first snapshot() rebuilds it
+
+    def _on_order_placed(self, order_id, order, store=None, event_id=None):
+        with self._lock:
+            if store in self._orders:
+                self._orders[store][order_id] = order
+
+    def _on_status_changed(self, order_id, status, store=None, event_id=None):
+        with self._lock:
+            orders = self._orders.get(store)
+            if orders is None:
+                return
+            order = orders.get(order_id)
+            if status not in db.OPEN_STATUSES:
+                orders.pop(order_id, None)
+            elif order is not None:
+                orders[order_id] = dict(order, status=status)
+
+    def _on_orders_removed(self, order_ids, store=None, event_id=None):
+        with self._lock:
+            orders = self._orders.get(store, {})
+            for order_id in order_ids:
+                orders.pop(order_id, None)
+
+open_orders = OpenOrdersIndex()
+open_orders.connect_signals()
@@ -0,0 +1,111 @@
+import json
+import threading
+from collections import deque
+
+import database as db
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+# Recent events kept so a reconnecting screen can catch up via Last-Event-ID
+HISTORY_SIZE = 256
+
+class OrderFeed:
+    """Fan order events out to every open /orders/stream connection
+
+    Subscribers block on a shared condition variable, so idle barista
+    screens cost a sleeping thread each and nothing else. Each event is
+    serialized once, however many screens are listening. There is one
+    feed per store, publishing only that store's orders.
+
+    Event ids are order_events ids, which every worker process shares, so
+    a screen that reconnects to a different `flask serve` worker resumes
+    from the right place. Another worker's events arrive through the
+    relay a moment late, so ids can come in out of order; each message
+    carries the highest id published so far, and subscribers follow the
+    feed in arrival order.
+    """
+
+    def __init__(self, store=None, history=HISTORY_SIZE):
+        self.store = store
+        self._cond = threading.Condition()
+        # (arrival number, event id, message), oldest first
+        self._events = deque(maxlen=history)
+        self._seq = 0
+        self._high = 0
+        # History holds every event after this id (None until first needed)
+        self._since = None
+
+    def publish(self, event_id, event, data):
+        """Queue one event for every subscriber"""
+        payload = json.dumps(data, separators=(',', ':'))
+        with self._cond:
+            if len(self._events) == self._events.maxlen and self._since is not None:
+                self._since = max(self._since, self._events[0][1])
+            self._seq += 1
+            self._high = max(self._high, event_id)
+            self._events.append((self._seq, event_id, f'id: {self._high}\nevent: {event}\ndata: {payload}\n\n'))
+            self._cond.notify_all()
+
+    def stream(self, last_id=None):
+        """Generate text/event-stream chunks, resuming after event id last_id"""
+        yield 'retry: 3000\n\n'
+        if self._since is None:
+            newest = db.get_last_event_id()
+            with self._cond:
+                if self._since is None:
+                    self._since = min([newest] + [event_id - 1 for _, event_id, _ in self._events])
+
+        with self._cond:
+            seq = self._seq
+            # Older than our history (restart, or too far behind): make the
+            # screen reload the full list once, then follow from here
+            lost = last_id is not None and last_id < self._since
+            resume = last_id is not None and not lost
+            if not resume:
+                last_id = 0
+            backlog = [message for _, event_id, message in self._events if event_id > last_id]
+        if lost:
+            yield 'event: reset\ndata: {}\n\n'
+        if backlog and resume:
+            yield ''.join(backlog)
+
+        while True:
+            with self._cond:
+                if self._seq == seq:
+                    self._cond.wait(HEARTBEAT_INTERVAL)
+                # Skip what the screen already had from the worker it left
+                messages = [message for number, event_id, message in self._events
+                            if number > seq and event_id > last_id]
+                seq = self._seq
+            if messages:
+                yield ''.join(messages)
+            else:
+                yield ': keep-alive\n\n'
+
+    def connect_signals(self):
+        """Publish the database order signals on this feed"""
+        db.order_placed.connect(self._on_order_placed, weak=False)
+        db.order_status_changed.connect(self._on_status_changed, weak=False)
+        db.orders_removed.connect(self._on_orders_removed, weak=False)
+
+    def _on_order_placed(self, order_id, order, store=None, event_id=None):
+        if store == self.store:
+            self.publish(event_id, 'order', order)
+
+    def _on_status_changed(self, order_id, status, store=None, event_id=None):
+        if store == self.store:
+            self.publish(event_id, 'status', {'id': order_id, 'status': status})
+
+    def _on_orders_removed(self, order_ids, store=None, event_id=None):
+        if store == self.store:
+            self.publish(event_id, 'removed', {'ids': order_ids})
+
+feeds = {}
+for store_id in db.store_ids():
+    feeds[store_id] = OrderFeed(store_id)
+    feeds[store_id].connect_signals()
+
+def get_feed():
+    """The feed of the current store"""
+    return feeds[db.current_store_id()]
@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, render_template, request
+from markupsafe import Markup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # optional: pip install brotli
+
+# Assembled pages kept in memory; one per (endpoint, menu, cart size)
+MAX_PAGES = 256
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+def _variants(html):
+    """Body bytes per content coding, compressed once up front"""
+    body = html.encode()
+    variants = {'identity': body, 'gzip': gzip.compress(body, GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return hashlib.sha1(body).hexdigest(), variants
+
+def _negotiate(variants):
+    """Smallest variant the client accepts"""
+    accepted = request.accept_encodings
+    best = 'identity'
+    for encoding, body in variants.items():
+        if encoding != 'identity' and accepted[encoding] and len(body) < len(variants[best]):
+            best = encoding
+    return best
+
+class PageCache:
+    """Rendered menu pages, by menu fingerprint
+
+    The menu markup is rendered once per menu version as a fragment; each
+    page is then assembled around it once per cart size (the only
+    per-session part) and stored with its gzip and, when the brotli module
+    is installed, brotli variants. A new menu fingerprint misses every key,
+    and old pages drop out of the LRU.
+    """
+
+    def __init__(self, max_pages=MAX_PAGES):
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+        self._fragments = {}
+        self._pages = OrderedDict()
+        self.hits = self.renders = self.fragment_renders = 0
+
+    def fragment(self, template, menu):
+        """Markup of template rendered with the menu's categories, once per version"""
+        key = (template, request.script_root, menu.fingerprint)
+        html = self._fragments.get(key)
+        if html is None:
+            html = Markup(render_template(template, categories=menu.by_category))
+            with self._lock:
+                for old in [k for k in self._fragments if k[:2] == key[:2]]:
+                    del self._fragments[old]
+                self._fragments[key] = html
+                self.fragment_renders += 1
+        return html
+
+    def response(self, key, render):
+        """HTML response for key, calling render() for the page text on a miss"""
+        # Links carry the store's /store/<id> prefix when there is one
+        key = (request.script_root,) + key
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+        if entry is None:
+            entry = _variants(render())
+            with self._lock:
+                self._pages[key] = entry
+                while len(self._pages) > self.max_pages:
+                    self._pages.popitem(last=False)
+                self.renders += 1
+
+        digest, variants = entry
+        encoding = _negotiate(variants)
+        response = Response(variants[encoding], mimetype='text/html')
+        if encoding != 'identity':
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.set_etag(f'{digest}-{encoding}')
+        # The cart size makes it per session; revalidate with the ETag
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def stats(self):
+        with self._lock:
+            return {'pages': len(self._pages), 'hits': self.hits, 'renders': self.renders,
+                    'fragment_renders': self.fragment_renders}
+
+cache = PageCache()
@@ -0,0 +1,193 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, before_render_template, request, template_rendered
+
+import database as db
+import page_cache
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Requests slower than this (milliseconds) go to the slow-request log
+SLOW_REQUEST_MS = 250
+SLOW_REQUEST_LOG = 'slow_requests.log'
+
+# Statements kept per request for the slow-request log; all are counted
+MAX_LOGGED_QUERIES = 100
+
+slow_log = logging.getLogger('coffee.slow_requests')
+
+class RequestProfile:
+    """Timings collected while one request is handled"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.query_seconds = 0.0
+        self.queries = []
+        self.template_seconds = 0.0
+        self.templates = []
+        self.render_started = None
+
+    def add_query(self, sql, seconds):
+        self.query_count += 1
+        self.query_seconds += seconds
+        if len(self.queries) < MAX_LOGGED_QUERIES:
+            self.queries.append({'sql': ' '.join(sql.split()), 'ms': round(seconds * 1000, 3)})
+
+class Metrics:
+    """Per-endpoint counters and histograms for this worker process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+        self.request_seconds = defaultdict(float)
+        self.queries = defaultdict(int)
+        self.query_seconds = defaultdict(float)
+        self.renders = defaultdict(int)
+        self.render_seconds = defaultdict(float)
+        self.slow_requests = 0
+
+    def observe(self, endpoint, seconds, profile, slow):
+        bucket = next((i for i, bound in enumerate(DURATION_BUCKETS) if seconds <= bound), len(DURATION_BUCKETS))
+        with self._lock:
+            self.requests[endpoint][bucket] += 1
+            self.request_seconds[endpoint] += seconds
+            self.queries[endpoint] += profile.query_count
+            self.query_seconds[endpoint] += profile.query_seconds
+            for name, render_seconds in profile.templates:
+                self.renders[name] += 1
+                self.render_seconds[name] += render_seconds
+            self.slow_requests += slow
+
+    def prometheus(self):
+        """Text exposition format"""
+        lines = []
+        with self._lock:
+            lines += ['# HELP coffee_request_duration_seconds Time spent handling a request.',
+                      '# TYPE coffee_request_duration_seconds histogram']
+            for endpoint, counts in sorted(self.requests.items()):
+                label = f'endpoint="{_escape(endpoint)}"'
+                total = 0
+                for bound, count in zip(DURATION_BUCKETS + ('+Inf',), counts):
+                    total += count
+                    lines.append(f'coffee_request_duration_seconds_bucket{{{label},le="{bound}"}} {total}')
+                lines.append(f'coffee_request_duration_seconds_sum{{{label}}} {self.request_seconds[endpoint]:.6f}')
+                lines.append(f'coffee_request_duration_seconds_count{{{label}}} {total}')
+            lines += _counter('coffee_sql_queries_total', 'SQL statements run on pooled connections.',
+                              'endpoint', self.queries)
+            lines += _counter('coffee_sql_query_seconds_total', 'Time to first row of those statements.',
+                              'endpoint', self.query_seconds)
+            lines += _counter('coffee_template_renders_total', 'render_template() calls.',
+                              'template', self.renders)
+            lines += _counter('coffee_template_render_seconds_total', 'Time spent rendering templates.',
+                              'template', self.render_seconds)
+            lines += ['# HELP coffee_slow_requests_total Requests written to the slow-request log.',
+                      '# TYPE coffee_slow_requests_total counter',
+                      f'coffee_slow_requests_total {self.slow_requests}']
+
+        for prefix, stats in (('coffee_pool', db.get_pool_stats()), ('coffee_writer', db.get_writer_stats()),
+                              ('coffee_page_cache', page_cache.cache.stats()),
+                              ('coffee_inventory', db.get_inventory_stats())):
+            for key, value in stats.items():
+                lines += [f'# TYPE {prefix}_{key} gauge', f'{prefix}_{key} {value}']
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _counter(name, help_text, label, values):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    for key, value in sorted(values.items()):
+        if isinstance(value, float):
+            value = f'{value:.6f}'
+        lines.append(f'{name}{{{label}="{_escape(key)}"}} {value}')
+    return lines
+
+metrics = Metrics()
+_local = threading.local()
+
+def _current():
+    return getattr(_local, 'profile', None)
+
+def _on_query(sql, seconds):
+    profile = _current()
+    if profile is not None:
+        profile.add_query(sql, seconds)
+
+def _before_render(sender, template, context, **extra):
+    profile = _current()
+    if profile is not None:
+        profile.render_started = time.perf_counter()
+
+def _after_render(sender, template, context, **extra):
+    profile = _current()
+    if profile is not None and profile.render_started is not None:
+        seconds = time.perf_counter() - profile.render_started
+        profile.template_seconds += seconds
+        profile.templates.append((template.name, seconds))
+
+def init_app(app):
+    """Turn on request profiling if PROFILING is set
+
+    Counts and times SQL on pooled connections and template rendering per
+    request, keeps per-endpoint histograms (served at /admin/metrics in
+    Prometheus text format) and logs requests slower than
+    PROFILING_SLOW_MS, with their queries, as JSON lines.
+    """
+    if not app.config.get('PROFILING'):
+        return
+    threshold = app.config.get('PROFILING_SLOW_MS', SLOW_REQUEST_MS) / 1000
+    if not slow_log.handlers:
+        handler = logging.FileHandler(app.config.get('PROFILING_SLOW_LOG', SLOW_REQUEST_LOG))
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.INFO)
+        slow_log.propagate = False
+
+    db.query_observer = _on_query
+    before_render_template.connect(_before_render, app, weak=False)
+    template_rendered.connect(_after_render, app, weak=False)
+
+    @app.before_request
+    def start_profile():
+        _local.profile = RequestProfile()
+
+    @app.after_request
+    def record_profile(response):
+        profile = _current()
+        if profile is None:
+            return response
+        seconds = time.perf_counter() - profile.started
+        endpoint = request.endpoint or 'unmatched'
+        slow = seconds >= threshold
+        metrics.observe(endpoint, seconds, profile, slow)
+        if slow:
+            slow_log.info(json.dumps({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'ms': round(seconds * 1000, 3),
+                'query_count': profile.query_count,
+                'query_ms': round(profile.query_seconds * 1000, 3),
+                'template_ms': round(profile.template_seconds * 1000, 3),
+                'queries': profile.queries,
+            }))
+        response.headers['Server-Timing'] = (
+            f'db;desc="{profile.query_count} queries";dur={profile.query_seconds * 1000:.3f}, '
+            f'tpl;dur={profile.template_seconds * 1000:.3f}, total;dur={seconds * 1000:.3f}'
+        )
+        return response
+
+    @app.teardown_request
+    def end_profile(exc=None):
+        _local.profile = None
+
+    app.add_url_rule('/admin/metrics', 'metrics',
+                     lambda: Response(metrics.prometheus(), mimetype='text/plain; version=0.0.4'))
@@ -0,0 +1,136 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# Rendered PNGs, named by the sha256 of their bytes
+QR_CACHE_DIR = os.environ.get('COFFEE_QR_CACHE', 'qr_cache')
+
+# Module (pixel) sizes a client may ask for; anything else is refused so
+# the cache cannot be filled with one-off renders
+QR_SIZES = (4, 8, 12, 16)
+DEFAULT_SIZE = 8
+
+# Number of (url, size) renders kept in memory
+MEMORY_CACHE_SIZE = 256
+
+def render_qr(url, size=DEFAULT_SIZE):
+    """Render url as QR code PNG bytes (runs in worker processes too)"""
+    import qrcode
+
+    code = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=size,
+        border=4,
+    )
+    code.add_data(url)
+    code.make(fit=True)
+    buffer = io.BytesIO()
+    code.make_image().save(buffer, format='PNG')
+    return buffer.getvalue()
+
+class QRCodeCache:
+    """Two-level cache of rendered QR codes keyed by (url, size)
+
+    PNG bytes are stored on disk under their content hash, which doubles as
+    a strong ETag; a small ref file maps each key to that hash so renders
+    survive restarts and are shared by every worker process. Hot codes are
+    also held in an in-memory LRU.
+    """
+
+    def __init__(self, directory=QR_CACHE_DIR, max_entries=MEMORY_CACHE_SIZE):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = self.disk_hits = self.renders = 0
+
+    def _key_path(self, url, size):
+        key = hashlib.sha1(f'{size}:{url}'.encode()).hexdigest()
+        return os.path.join(self.directory, 'refs', key)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def lookup(self, url, size=DEFAULT_SIZE):
+        """(etag, png) from memory or disk, or None if never rendered"""
+        key = (url, size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        try:
+            with open(self._key_path(url, size)) as f:
+                digest = f.read().strip()
+            with open(os.path.join(self.directory, f'{digest}.png'), 'rb') as f:
+                png = f.read()
+        except FileNotFoundError:
+            return None
+        entry = (digest, png)
+        self._remember(key, entry)
+        self.disk_hits += 1
+        return entry
+
+    def store(self, url, size, png):
+        """Save a rendered code and return its (etag, png)"""
+        digest = hashlib.sha256(png).hexdigest()
+        os.makedirs(os.path.join(self.directory, 'refs'), exist_ok=True)
+        path = os.path.join(self.directory, f'{digest}.png')
+        if not os.path.exists(path):
+            _write_atomic(path, png)
+        _write_atomic(self._key_path(url, size), digest.encode())
+        entry = (digest, png)
+        self._remember((url, size), entry)
+        return entry
+
+    def get(self, url, size=DEFAULT_SIZE):
+        """(etag, png) for url, rendering it on a miss"""
+        entry = self.lookup(url, size)
+        if entry is None:
+            self.renders += 1
+            entry = self.store(url, size, render_qr(url, size))
+        return entry
+
+    def render_many(self, urls, size=DEFAULT_SIZE, workers=None):
+        """Render every url not cached yet across a process pool
+
+        Returns {url: (etag, png)} for all of urls.
+        """
+        results = {}
+        missing = []
+        for url in urls:
+            entry = self.lookup(url, size)
+            if entry is None:
+                missing.append(url)
+            else:
+                results[url] = entry
+
+        if missing:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for url, png in zip(missing, pool.map(render_qr, missing, [size] * len(missing))):
+                    self.renders += 1
+                    results[url] = self.store(url, size, png)
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {'memory_entries': len(self._entries), 'hits': self.hits,
+                    'disk_hits': self.disk_hits, 'renders': self.renders}
+
+def _write_atomic(path, data):
+    # Concurrent workers may render the same code; never expose a partial file
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+cache = QRCodeCache()
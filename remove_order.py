@@ -1,157 +1,163 @@
+"""Bulk order maintenance.
+
+Remove orders (and their items) by customer, by id, by date range or from
+a file of ids. Deletes are set-based, a chunk of orders per transaction,
+so purging millions of rows is quick and never blocks the app for long:
+
+    python remove_order.py customer alex sam --dry-run
+    python remove_order.py ids 12 15 18
+    python remove_order.py dates --start 2024-01-01 --end 2024-06-30 --status collected
+    python remove_order.py file stale_ids.txt --yes
+    python remove_order.py list --limit 50
+
+Only live orders are removed; orders already moved to the monthly
+archives by `flask archive-orders` are left alone. With several stores
+(COFFEE_STORES), pick one with --store:
+
+    python remove_order.py --store airport customer alex
+"""
+from datetime import datetime
+
+import click
+
 import database as db
 
-def remove_orders_by_name(customer_name):
-    """Remove all orders for a specific customer name"""
-    conn = db.get_db_connection()
-    
-    try:
-        # First, check if any orders exist for this customer
-        orders = conn.execute(
-            'SELECT * FROM orders WHERE customer_name = ?', 
-            (customer_name,)
-        ).fetchall()
-        
-        if not orders:
-            print(f"No orders found for customer: {customer_name}")
-            return False
-        
-        print(f"Found {len(orders)} order(s) for {customer_name}:")
-        for order in orders:
-            coffee = conn.execute(
-                'SELECT name FROM coffee_types WHERE id = ?', 
-                (order['coffee_type_id'],)
-            ).fetchone()
-            coffee_name = coffee['name'] if coffee else "Unknown"
-            print(f"  - Order ID: {order['id']}, Coffee: {coffee_name}, Quantity: {order['quantity']}, Total: ${order['total_price']}")
-        
-        # Confirm deletion
-        confirm = input(f"\nAre you sure you want to delete all {len(orders)} order(s) for {customer_name}? (y/n): ")
-        
-        if confirm.lower() == 'y':
-            # Delete the orders
-            conn.execute(
-                'DELETE FROM orders WHERE customer_name = ?', 
-                (customer_name,)
-            )
-            conn.commit()
-            print(f"Successfully deleted {len(orders)} order(s) for {customer_name}")
-            return True
-        else:
-            print("Deletion cancelled.")
-            return False
-            
-    except Exception as e:
-        print(f"Error removing orders: {e}")
-        return False
-    finally:
-        conn.close()
-
-def remove_single_order(order_id):
-    """Remove a specific order by order ID"""
-    conn = db.get_db_connection()
-    
-    try:
-        # Check if order exists
-        order = conn.execute(
-            'SELECT * FROM orders WHERE id = ?', 
-            (order_id,)
-        ).fetchone()
-        
-        if not order:
-            print(f"No order found with ID: {order_id}")
-            return False
-        
-        coffee = conn.execute(
-            'SELECT name FROM coffee_types WHERE id = ?', 
-            (order['coffee_type_id'],)
-        ).fetchone()
-        coffee_name = coffee['name'] if coffee else "Unknown"
-        
-        print(f"Order found:")
-        print(f"  - Order ID: {order['id']}")
-        print(f"  - Customer: {order['customer_name']}")
-        print(f"  - Coffee: {coffee_name}")
-        print(f"  - Quantity: {order['quantity']}")
-        print(f"  - Total: ${order['total_price']}")
-        
-        # Confirm deletion
-        confirm = input(f"\nAre you sure you want to delete this order? (y/n): ")
-        
-        if confirm.lower() == 'y':
-            # Delete the order
-            conn.execute('DELETE FROM orders WHERE id = ?', (order_id,))
-            conn.commit()
-            print(f"Successfully deleted order ID: {order_id}")
-            return True
-        else:
-            print("Deletion cancelled.")
-            return False
-            
-    except Exception as e:
-        print(f"Error removing order: {e}")
-        return False
-    finally:
-        conn.close()
-
-def show_all_orders():
-    """Display all current orders"""
-    conn = db.get_db_connection()
-    orders = conn.execute('''
-        SELECT o.*, c.name as coffee_name 
-        FROM orders o 
-        JOIN coffee_types c ON o.coffee_type_id = c.id 
-        ORDER BY o.order_date DESC
-    ''').fetchall()
-    conn.close()
-    
+def _marks(values):
+    return ', '.join('?' * len(values))
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _purge(selections, dry_run, yes, chunk_size):
+    """Count, confirm and delete the orders matched by (where, params) selections"""
+    orders = items = 0
+    total = 0.0
+    for where, params in selections:
+        counts = db.count_orders(where, params)
+        orders += counts[0]
+        items += counts[1]
+        total += counts[2]
+
+    if not orders:
+        click.echo("No matching orders found.")
+        return
+    click.echo(f"{orders} order(s) with {items} item(s), ${total:.2f} in total")
+    if dry_run:
+        click.echo("Dry run: nothing deleted.")
+        return
+    if not yes:
+        click.confirm(f"Delete these {orders} order(s)?", abort=True)
+
+    removed = 0
+    with click.progressbar(length=orders, label='Deleting orders') as bar:
+        for where, params in selections:
+            for ids in db.delete_orders(where, params, chunk_size):
+                removed += len(ids)
+                bar.update(len(ids))
+    click.echo(f"Deleted {removed} order(s)")
+
+def _by_ids(order_ids, chunk_size):
+    """Selections for an id list, small enough to bind as parameters"""
+    order_ids = sorted(set(order_ids))
+    return [(f'id IN ({_marks(chunk)})', chunk) for chunk in _chunks(order_ids, chunk_size)]
+
+def _date(ctx, param, value):
+    if value is not None:
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise click.BadParameter('expected YYYY-MM-DD')
+    return value
+
+dry_run_option = click.option('--dry-run', is_flag=True, help='Only report what would be deleted.')
+yes_option = click.option('--yes', '-y', is_flag=True, help='Do not ask for confirmation.')
+chunk_size_option = click.option('--chunk-size', default=db.DELETE_CHUNK_SIZE, show_default=True,
+                                 help='Orders deleted per transaction.')
+
+@click.group()
+@click.option('--store', envvar='COFFEE_STORE', type=click.Choice([s for s in db.store_ids() if s]),
+              help='Store to work on when COFFEE_STORES is set (default: $COFFEE_STORE).')
+@click.pass_context
+def cli(ctx, store):
+    """ctrl+coffee order maintenance tools."""
+    if store:
+        ctx.with_resource(db.use_store(store))
+    elif db.STORES:
+        raise click.UsageError(f"Pick a store with --store ({', '.join(db.STORES)}).")
+
+@cli.command()
+@click.argument('names', nargs=-1, required=True)
+@dry_run_option
+@yes_option
+@chunk_size_option
+def customer(names, dry_run, yes, chunk_size):
+    """Remove every order placed by the given customer names."""
+    _purge([(f'customer_name IN ({_marks(names)})', names)], dry_run, yes, chunk_size)
+
+@cli.command()
+@click.argument('order_ids', nargs=-1, required=True, type=int)
+@dry_run_option
+@yes_option
+@chunk_size_option
+def ids(order_ids, dry_run, yes, chunk_size):
+    """Remove orders by id."""
+    _purge(_by_ids(order_ids, chunk_size), dry_run, yes, chunk_size)
+
+@cli.command('file')
+@click.argument('path', type=click.File('r'))
+@dry_run_option
+@yes_option
+@chunk_size_option
+def from_file(path, dry_run, yes, chunk_size):
+    """Remove the orders whose ids are listed in a file (one per line, '-' for stdin)."""
+    order_ids = []
+    for number, line in enumerate(path, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if not line.isdigit():
+            raise click.BadParameter(f'line {number}: not an order id: {line!r}', param_hint='PATH')
+        order_ids.append(int(line))
+    _purge(_by_ids(order_ids, chunk_size), dry_run, yes, chunk_size)
+
+@cli.command()
+@click.option('--start', callback=_date, help='First order date to remove (YYYY-MM-DD).')
+@click.option('--end', callback=_date, help='Last order date to remove (YYYY-MM-DD).')
+@click.option('--status', 'statuses', multiple=True, type=click.Choice(db.ORDER_STATUSES),
+              help='Only orders in this status (repeatable).')
+@dry_run_option
+@yes_option
+@chunk_size_option
+def dates(start, end, statuses, dry_run, yes, chunk_size):
+    """Remove orders placed within a date range."""
+    if not start and not end:
+        raise click.UsageError('Give --start, --end or both.')
+    conditions = []
+    params = []
+    if start:
+        conditions.append('order_date >= ?')
+        params.append(start)
+    if end:
+        conditions.append("order_date < date(?, '+1 day')")
+        params.append(end)
+    if statuses:
+        conditions.append(f'status IN ({_marks(statuses)})')
+        params.extend(statuses)
+    _purge([(' AND '.join(conditions), params)], dry_run, yes, chunk_size)
+
+@cli.command('list')
+@click.option('--limit', default=20, show_default=True, type=click.IntRange(1, db.MAX_ORDERS_PAGE_SIZE),
+              help='Number of recent orders to show.')
+def list_orders(limit):
+    """Show the most recent orders."""
+    orders, _ = db.get_orders_page(page_size=limit)
     if not orders:
-        print("No orders found in the database.")
+        click.echo("No orders found in the database.")
         return
-    
-    print("\nCurrent Orders:")
-    print("-" * 80)
     for order in orders:
-        print(f"ID: {order['id']} | Customer: {order['customer_name']:15} | Coffee: {order['coffee_name']:12} | Qty: {order['quantity']:2} | Total: ${order['total_price']:6.2f} | Date: {order['order_date']}")
-    print("-" * 80)
-
-def main():
-    """Main function to run the order removal utility"""
-    print("=" * 50)
-    print("    ctrl+coffee - Order Management Tool")
-    print("=" * 50)
-    
-    while True:
-        print("\nOptions:")
-        print("1. Remove orders by customer name")
-        print("2. Remove single order by ID")
-        print("3. View all orders")
-        print("4. Exit")
-        
-        choice = input("\nEnter your choice (1-4): ").strip()
-        
-        if choice == '1':
-            customer_name = input("Enter customer name to remove orders: ").strip()
-            if customer_name:
-                remove_orders_by_name(customer_name)
-            else:
-                print("Customer name cannot be empty.")
-                
-        elif choice == '2':
-            try:
-                order_id = int(input("Enter order ID to remove: ").strip())
-                remove_single_order(order_id)
-            except ValueError:
-                print("Please enter a valid order ID (number).")
-                
-        elif choice == '3':
-            show_all_orders()
-            
-        elif choice == '4':
-            print("Goodbye!")
-            break
-            
-        else:
-            print("Invalid choice. Please enter 1, 2, 3, or 4.")
+        click.echo(f"ID: {order['id']} | Customer: {order['customer_name']:15} | Status: {order['status']:9} | "
+                   f"Total: ${order['total_amount']:6.2f} | Date: {order['order_date']} | {order['items_description'] or ''}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    cli()
@@ -0,0 +1,299 @@
+"""Prefork production server: `flask serve`.
+
+The master process loads the app once (migrations run, menu and open-orders
+index warmed), opens the listening socket and forks the workers, which each
+run a threaded werkzeug server on that socket, or with --reuse-port on their
+own SO_REUSEPORT socket so the kernel spreads connections between them.
+Workers that exit, or stop sending heartbeats, are replaced.
+
+    SIGTERM, SIGINT    finish in-flight requests, then stop
+    SIGHUP             restart the workers one at a time
+    SIGTTIN, SIGTTOU   add / remove a worker
+
+Each worker tails the order_events table (database.EventRelay), so the
+live order screens see orders placed through any worker.
+"""
+import json
+import os
+import random
+import signal
+import socket
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+import database as db
+
+# Seconds between worker heartbeats, and without one before a worker is killed
+HEARTBEAT_INTERVAL = 2
+WORKER_TIMEOUT = 30
+
+# Seconds a stopping worker gets to finish its requests (SSE streams never do)
+GRACEFUL_TIMEOUT = 30
+
+# Directory of worker-<pid>.json heartbeat files, inherited by the workers
+WORKER_DIR_ENV = 'COFFEE_WORKER_DIR'
+
+def worker_status():
+    """Heartbeat of every worker of the running `flask serve` ([] under any other server)"""
+    directory = os.environ.get(WORKER_DIR_ENV)
+    if not directory or not os.path.isdir(directory):
+        return []
+    now = time.time()
+    workers = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            continue  # worker just exited
+        status['heartbeat_age'] = round(now - status['heartbeat'], 3)
+        status['healthy'] = status['heartbeat_age'] < WORKER_TIMEOUT
+        workers.append(status)
+    return workers
+
+def _listen(host, port, reuse_port=False, backlog=128):
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+class Worker:
+    """One server process: a threaded werkzeug server plus a heartbeat"""
+
+    def __init__(self, app, host, port, sock, max_requests, graceful_timeout, directory):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.sock = sock
+        # Jitter so workers forked together do not all restart together
+        self.max_requests = max_requests + random.randint(0, max_requests // 10) if max_requests else 0
+        self.graceful_timeout = graceful_timeout
+        self.directory = directory
+        self.started = time.time()
+        self.requests = 0
+        self.active = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def run(self):
+        """Serve until told to stop (runs in the forked child)"""
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *args: self._stopping.set())
+        for sig in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, signal.SIG_IGN)
+
+        sock = self.sock or _listen(self.host, self.port, reuse_port=True)
+        db.start_event_relay()
+        server = make_server(self.host, self.port, self._wsgi, threaded=True, fd=sock.fileno())
+        threading.Thread(target=server.serve_forever, name='http', daemon=True).start()
+        self._heartbeat()
+        while not self._stopping.wait(HEARTBEAT_INTERVAL):
+            self._heartbeat()
+
+        # Stop accepting; the master's other workers pick up the backlog
+        server.shutdown()
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.active and time.monotonic() < deadline:
+            time.sleep(0.1)
+        server.server_close()
+        # os._exit() skips atexit: write back this worker's stock changes
+        db.close_connections()
+        try:
+            os.remove(self._status_path())
+        except OSError:
+            pass
+
+    def _wsgi(self, environ, start_response):
+        with self._lock:
+            self.active += 1
+            self.requests += 1
+            if self.max_requests and self.requests >= self.max_requests:
+                self._stopping.set()
+        try:
+            iterable = self.app(environ, start_response)
+            try:
+                yield from iterable
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def _status_path(self):
+        return os.path.join(self.directory, f'worker-{os.getpid()}.json')
+
+    def _heartbeat(self):
+        with self._lock:
+            status = {'pid': os.getpid(), 'started': self.started, 'requests': self.requests,
+                      'active': self.active, 'heartbeat': time.time()}
+        # Request threads come and go; the pool hit rate shows their
+        # connections being reused ('' is the single store)
+        status['pools'] = {}
+        for store_id in db.store_ids():
+            with db.use_store(store_id):
+                status['pools'][store_id or ''] = db.get_pool_stats()
+        path = self._status_path()
+        with open(path + '.tmp', 'w') as f:
+            json.dump(status, f)
+        os.replace(path + '.tmp', path)
+
+class Arbiter:
+    """Master process: forks workers and keeps the right number alive"""
+
+    def __init__(self, app, host, port, workers, reuse_port=False, max_requests=0,
+                 graceful_timeout=GRACEFUL_TIMEOUT, timeout=WORKER_TIMEOUT):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.target = workers
+        self.reuse_port = reuse_port
+        self.max_requests = max_requests
+        self.graceful_timeout = graceful_timeout
+        self.timeout = timeout
+        self.workers = {}
+        self._signals = []
+
+    def run(self):
+        self.directory = tempfile.mkdtemp(prefix='coffee-serve-')
+        os.environ[WORKER_DIR_ENV] = self.directory
+        if self.reuse_port:
+            # Check the port is free, but never accept here: the kernel
+            # would hand this idle socket its share of connections
+            _listen(self.host, self.port, reuse_port=True).close()
+            self.sock = None
+        else:
+            self.sock = _listen(self.host, self.port)
+
+        # Everything the workers share copy-on-write is loaded before fork()
+        db.get_menu()
+        db.close_connections()
+
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU, signal.SIGCHLD):
+            signal.signal(sig, lambda sig, frame: self._signals.append(sig))
+
+        print(f"ctrl+coffee listening on http://{self.host}:{self.port} "
+              f"with {self.target} workers (master pid {os.getpid()})")
+        try:
+            self._loop()
+        finally:
+            self._stop_all()
+            if self.sock is not None:
+                self.sock.close()
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+            os.rmdir(self.directory)
+
+    def _loop(self):
+        while True:
+            self._reap()
+            while self._signals:
+                sig = self._signals.pop(0)
+                if sig in (signal.SIGTERM, signal.SIGINT):
+                    return
+                if sig == signal.SIGHUP:
+                    self._rolling_restart()
+                elif sig == signal.SIGTTIN:
+                    self.target += 1
+                elif sig == signal.SIGTTOU and self.target > 1:
+                    self.target -= 1
+            self._kill_stale()
+            while len(self.workers) < self.target:
+                self._spawn()
+            while len(self.workers) > self.target:
+                self._signal(max(self.workers), signal.SIGTERM)
+                self.workers.pop(max(self.workers))
+            time.sleep(0.5)
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = time.time()
+            return pid
+        # Child: never return into the master's loop or run its atexit hooks
+        status = 0
+        try:
+            Worker(self.app, self.host, self.port, self.sock, self.max_requests,
+                   self.graceful_timeout, self.directory).run()
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            if self.workers.pop(pid, None) is not None:
+                print(f"Worker {pid} exited ({status}), replacing it")
+            try:
+                os.remove(os.path.join(self.directory, f'worker-{pid}.json'))
+            except OSError:
+                pass
+
+    def _kill_stale(self):
+        now = time.time()
+        for pid, started in list(self.workers.items()):
+            try:
+                beat = os.path.getmtime(os.path.join(self.directory, f'worker-{pid}.json'))
+            except OSError:
+                beat = started  # not up yet
+            if now - beat > self.timeout:
+                print(f"Worker {pid} missed its heartbeats, killing it")
+                self._signal(pid, signal.SIGKILL)
+
+    def _rolling_restart(self):
+        for old in list(self.workers):
+            new = self._spawn()
+            # Wait for the replacement's first heartbeat before retiring the old one
+            deadline = time.time() + self.timeout
+            while not os.path.exists(os.path.join(self.directory, f'worker-{new}.json')) and time.time() < deadline:
+                time.sleep(0.1)
+            self._signal(old, signal.SIGTERM)
+            self.workers.pop(old, None)
+
+    def _signal(self, pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def _stop_all(self):
+        for pid in self.workers:
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.time() + self.graceful_timeout + 5
+        while time.time() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                time.sleep(0.1)
+        else:
+            for pid in self.workers:
+                self._signal(pid, signal.SIGKILL)
+        self.workers.clear()
+
+def serve(app, host='0.0.0.0', port=8000, workers=None, **options):
+    """Run app on every core with a prefork master, or in-process without fork()"""
+    workers = workers or os.cpu_count() or 1
+    if not hasattr(os, 'fork'):
+        print(f"No fork() on this platform; serving on http://{host}:{port} from one process")
+        make_server(host, port, app, threaded=True).serve_forever()
+        return
+    Arbiter(app, host, port, workers, **options).run()
@@ -0,0 +1,174 @@
+import copy
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+import database as db
+
+# Seconds an idle server-side session lives before it is dropped
+SESSION_TTL = 2 * 60 * 60
+
+# Upper bound on sessions the in-process store keeps before evicting the
+# least recently used one
+MEMORY_STORE_MAX_SESSIONS = 10000
+
+# How often (seconds) the SQLite store sweeps out expired rows
+PURGE_INTERVAL = 10 * 60
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict whose data lives on the server, keyed by an opaque id"""
+
+    def __init__(self, initial=None, sid=None, new=False, refresh=False):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+        # Set when the stored expiry is getting close and should be pushed back
+        self.refresh = refresh
+
+class MemorySessionStore:
+    """In-process LRU session store with TTL expiry
+
+    Fastest option, but sessions are lost on restart and are not shared
+    between worker processes.
+    """
+
+    def __init__(self, max_sessions=MEMORY_STORE_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._sessions.get(sid)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._sessions[sid]
+                return None
+            self._sessions.move_to_end(sid)
+            # Hand out a copy so concurrent requests never share cart dicts
+            return copy.deepcopy(entry[0]), entry[1]
+
+    def save(self, sid, data, expires_at):
+        with self._lock:
+            self._sessions[sid] = (data, expires_at)
+            self._sessions.move_to_end(sid)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+class SqliteSessionStore:
+    """Session store backed by the sessions table in the orders database
+
+    Survives restarts and is shared by every worker process. Writes go
+    through the database write queue.
+    """
+
+    def __init__(self):
+        self._purged = time.monotonic()
+
+    def load(self, sid):
+        row = db.load_session(sid)
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save(self, sid, data, expires_at):
+        db.save_session(sid, json.dumps(data, separators=(',', ':')), expires_at)
+        if time.monotonic() - self._purged > PURGE_INTERVAL:
+            self._purged = time.monotonic()
+            db.purge_expired_sessions()
+
+    def delete(self, sid):
+        db.delete_session(sid)
+
+SESSION_STORES = {
+    'memory': MemorySessionStore,
+    'sqlite': SqliteSessionStore,
+}
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keep session data on the server and only an opaque id in the cookie
+
+    Unlike the default signed cookie, nothing is serialized, signed or
+    re-sent unless the session actually changed.
+    """
+
+    def __init__(self, store, ttl=SESSION_TTL):
+        self.store = store
+        self.ttl = ttl
+
+    def _ttl(self, app, session):
+        if session.permanent:
+            return app.permanent_session_lifetime.total_seconds()
+        return self.ttl
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            entry = self.store.load(sid)
+            if entry is not None:
+                data, expires_at = entry
+                refresh = expires_at - time.time() < self.ttl / 2
+                return ServerSideSession(data, sid=sid, refresh=refresh)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        # Emptied session: forget it on both ends
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        if not (session.modified or session.refresh):
+            return
+
+        self.store.save(session.sid, dict(session), time.time() + self._ttl(app, session))
+        if session.new or session.permanent or session.refresh:
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=httponly, domain=domain, path=path,
+                                secure=secure, samesite=samesite)
+            response.vary.add('Cookie')
+
+def init_app(app):
+    """Switch the app to a server-side session store if one is configured
+
+    SESSION_BACKEND is 'cookie' (Flask's default signed cookie), 'memory'
+    or 'sqlite'.
+    """
+    backend = app.config.setdefault('SESSION_BACKEND', 'cookie')
+    if backend == 'cookie':
+        return
+    if backend not in SESSION_STORES:
+        raise ValueError(f"Unknown session backend: {backend}")
+    app.session_interface = ServerSideSessionInterface(
+        SESSION_STORES[backend](),
+        ttl=app.config.get('SESSION_TTL', SESSION_TTL)
+    )
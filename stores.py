@@ -0,0 +1,53 @@
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import ClosingIterator
+
+import database as db
+
+# Path prefix that selects a store: /store/<id>/menu
+STORE_PREFIX = '/store/'
+
+class StoreRouter:
+    """WSGI middleware that sends each request to one store's database
+
+    The store comes from the subdomain (<id>.STORE_DOMAIN), then a
+    /store/<id> path prefix, then COFFEE_STORE. The prefix is moved into
+    SCRIPT_NAME, so url_for() keeps every link inside the same store.
+    Runs before Flask opens the session, which lives in the store's file.
+    """
+
+    def __init__(self, wsgi_app, domain=None):
+        self.wsgi_app = wsgi_app
+        self.domain = domain
+
+    def resolve(self, environ):
+        """Store id for a request (may rewrite environ), or None if there is none"""
+        if self.domain:
+            host = environ.get('HTTP_HOST', '').split(':')[0].lower()
+            if host.endswith('.' + self.domain):
+                return host[:-len(self.domain) - 1]
+
+        path = environ.get('PATH_INFO', '')
+        if path.startswith(STORE_PREFIX):
+            store_id, _, rest = path[len(STORE_PREFIX):].partition('/')
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + STORE_PREFIX + store_id
+            environ['PATH_INFO'] = '/' + rest
+            return store_id
+        return db.DEFAULT_STORE
+
+    def __call__(self, environ, start_response):
+        store_id = self.resolve(environ)
+        if store_id not in db.store_ids():
+            return Response('Unknown store', status=404)(environ, start_response)
+        token = db.select_store(store_id)
+        try:
+            # Streamed bodies (SSE, exports) run while the store is selected
+            return ClosingIterator(self.wsgi_app(environ, start_response), lambda: db.reset_store(token))
+        except BaseException:
+            db.reset_store(token)
+            raise
+
+def init_app(app):
+    """Route requests to their store when COFFEE_STORES is set"""
+    if not db.STORES:
+        return
+    app.wsgi_app = StoreRouter(app.wsgi_app, app.config.get('STORE_DOMAIN'))
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# database.py reads its settings at import, and schema.sql / migrations/
+# relative to the working directory; the tests get a throwaway database
+os.chdir(ROOT)
+TMP = tempfile.mkdtemp(prefix='coffee-tests-')
+os.environ['COFFEE_DB'] = os.path.join(TMP, 'coffee_orders.db')
+os.environ['COFFEE_ARCHIVE_DIR'] = os.path.join(TMP, 'archive')
+for name in ('COFFEE_STORES', 'COFFEE_STORE', 'COFFEE_PUBLIC_URL'):
+    os.environ.pop(name, None)
+
+@pytest.fixture(scope='session')
+def app():
+    """The app, bound to a fresh seeded database"""
+    import app as coffee
+    return coffee.app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,47 @@
+import database as db
+
+def snapshot():
+    """The stats row and the sales rollups, which archiving must not change"""
+    conn = db.get_db_connection()
+    tables = {table: [tuple(row) for row in conn.execute(f'SELECT * FROM {table} ORDER BY 1, 2')]
+              for table in ('sales_daily', 'sales_hourly', 'item_daily')}
+    conn.close()
+    return db.get_database_stats(), tables
+
+def live_ids(ids):
+    conn = db.get_db_connection()
+    marks = ', '.join('?' * len(ids))
+    found = [row[0] for row in conn.execute(f'SELECT id FROM orders WHERE id IN ({marks}) ORDER BY id', ids)]
+    conn.close()
+    return found
+
+def test_archive_orders(app):
+    coffee = db.get_coffee_types()[0]
+    placed = [db.place_order(f'Archive {n}', [{'coffee_type_id': coffee['id'], 'quantity': n + 1}])
+              for n in range(5)]
+    old, still_open, recent = placed[:3], placed[3], placed[4]
+    conn = db.get_db_connection()
+    conn.executemany("UPDATE orders SET order_date = ?, status = 'collected' WHERE id = ?",
+                     [(f'2021-03-0{n + 1} 09:00:00', order_id) for n, order_id in enumerate(old)])
+    conn.execute("UPDATE orders SET order_date = '2021-03-05 09:00:00' WHERE id = ?", (still_open,))
+    conn.execute("UPDATE orders SET status = 'collected' WHERE id = ?", (recent,))
+    conn.commit()
+    conn.close()
+    # Count the back-dated orders on their new days
+    db.rebuild_sales_rollups()
+    before = snapshot()
+
+    assert db.archive_orders(older_than_days=90, batch_size=2) == {'2021-03': 3}
+    assert live_ids(placed) == [still_open, recent]
+    for n, order_id in enumerate(old):
+        details = db.get_order_details(order_id)
+        assert details['order']['customer_name'] == f'Archive {n}'
+        assert details['order']['status'] == 'collected'
+        assert [(item['coffee_type_id'], item['quantity']) for item in details['items']] == [(coffee['id'], n + 1)]
+    assert snapshot() == before
+    assert [month for month, path in db.list_archives()] == ['2021-03']
+
+    # Nothing left to move
+    assert db.archive_orders(older_than_days=90) == {}
+    assert live_ids(placed) == [still_open, recent]
+    assert snapshot() == before
@@ -0,0 +1,56 @@
+import threading
+
+import database as db
+
+def order_count(customer_name):
+    conn = db.get_db_connection()
+    count = conn.execute('SELECT COUNT(*) FROM orders WHERE customer_name = ?', (customer_name,)).fetchone()[0]
+    conn.close()
+    return count
+
+def items():
+    return [{'coffee_type_id': db.get_coffee_types()[0]['id'], 'quantity': 1}]
+
+def test_racing_submits_with_one_key_place_one_order(app):
+    results = []
+    barrier = threading.Barrier(8)
+
+    def submit():
+        barrier.wait()
+        results.append(db.place_order('Racer', items(), 'race-key'))
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 8
+    assert len(set(results)) == 1
+    assert order_count('Racer') == 1
+    assert db.get_idempotent_order('race-key') == results[0]
+
+def test_removed_order_is_not_replayed(app):
+    first = db.place_order('Gone', items(), 'gone-key')
+    db.remove_orders_by_customer('Gone')
+    assert db.get_idempotent_order('gone-key') is None
+
+    second = db.place_order('Gone', items(), 'gone-key')
+    assert second != first
+    assert db.get_idempotent_order('gone-key') == second
+
+def test_api_checkout_replays_with_header(client):
+    client.post('/api/cart', json={'coffee_type_id': items()[0]['coffee_type_id'], 'quantity': 1})
+    placed = client.post('/api/checkout', json={'customer_name': 'Kiosk'}, headers={'Idempotency-Key': 'api-key'})
+    assert placed.status_code == 201
+
+    replay = client.post('/api/checkout', json={'customer_name': 'Kiosk'}, headers={'Idempotency-Key': 'api-key'})
+    assert replay.status_code == 200
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert replay.get_json()['order']['id'] == placed.get_json()['order']['id']
+
+    list(db.delete_orders('customer_name = ?', ('Kiosk',)))
+    client.post('/api/cart', json={'coffee_type_id': items()[0]['coffee_type_id'], 'quantity': 1})
+    again = client.post('/api/checkout', json={'customer_name': 'Kiosk'}, headers={'Idempotency-Key': 'api-key'})
+    assert again.status_code == 201
+    assert 'Idempotent-Replayed' not in again.headers
@@ -0,0 +1,11 @@
+import database as db
+
+def test_app_import_creates_the_stats_table(app, client):
+    # No __main__ setup: everything the pages need comes from init_app()
+    assert client.get('/').status_code == 200
+    assert client.get('/orders').status_code == 200
+    conn = db.get_db_connection()
+    # The stats row keeps counting archived orders
+    orders = conn.execute('SELECT (SELECT COUNT(*) FROM orders) + (SELECT COUNT(*) FROM archived_orders)').fetchone()[0]
+    conn.close()
+    assert db.get_database_stats()['orders_count'] == orders
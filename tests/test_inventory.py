@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+
+import database as db
+from inventory import Inventory
+
+class FakeTable:
+    """Stands in for the inventory table: load() and flush() callbacks"""
+
+    def __init__(self, counts):
+        self.counts = dict(counts)
+        self.flushes = []
+
+    def load(self):
+        return dict(self.counts)
+
+    def flush(self, changes):
+        self.flushes.append(dict(changes))
+        for item, delta in changes.items():
+            self.counts[item] += delta
+
+@pytest.fixture
+def table():
+    return FakeTable({1: 5, 2: 1})
+
+@pytest.fixture
+def inventory(table):
+    inventory = Inventory(table.load, table.flush, interval=3600)
+    yield inventory
+    inventory.close()
+
+def test_reserve_is_all_or_nothing(inventory):
+    assert inventory.reserve({1: 2, 2: 2}) == [2]
+    assert inventory.available(1) == 5
+    assert inventory.reserve({1: 2, 2: 1, 3: 9}) == []  # 3 is not tracked
+    assert inventory.available(1) == 3
+    assert inventory.available(3) is None
+    assert inventory.get_sold_out() == {2}
+
+@pytest.mark.parametrize('quantity', [0, -10])
+def test_reserve_rejects_quantities_below_one(inventory, quantity):
+    with pytest.raises(ValueError):
+        inventory.reserve({1: quantity})
+    assert inventory.available(1) == 5
+
+def test_release_puts_stock_back(inventory):
+    assert inventory.reserve({2: 1}) == []
+    assert inventory.get_sold_out() == {2}
+    inventory.release({2: 1})
+    assert inventory.available(2) == 1
+    assert inventory.get_sold_out() == frozenset()
+
+def test_flush_writes_one_batch_and_keeps_later_sales(inventory, table):
+    inventory.reserve({1: 1})
+    inventory.reserve({1: 2})
+    assert table.counts[1] == 5  # nothing written per reservation
+    inventory.flush()
+    assert table.flushes == [{1: -3}]
+    # Another worker sells one; the reload sees it
+    table.counts[1] -= 1
+    inventory.reserve({1: 1})
+    inventory.flush()
+    assert table.counts[1] == 0
+    assert inventory.available(1) == 0
+
+def test_racing_reservations_never_oversell(inventory):
+    taken = []
+    barrier = threading.Barrier(20)
+
+    def buy():
+        barrier.wait()
+        if not inventory.reserve({1: 1}):
+            taken.append(1)
+
+    threads = [threading.Thread(target=buy) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(taken) == 5
+    assert inventory.available(1) == 0
+
+@pytest.fixture
+def tracked(app):
+    """An item with 3 in stock, untracked again afterwards"""
+    coffee_type_id = db.get_coffee_types()[-1]['id']
+    db.set_stock(coffee_type_id, 3)
+    yield coffee_type_id
+    db.set_stock(coffee_type_id, None)
+
+def test_place_order_sells_out_and_hides_the_item(tracked):
+    db.place_order('Stock', [{'coffee_type_id': tracked, 'quantity': 3}])
+    assert db.get_stock(tracked) == 0
+    with pytest.raises(db.OutOfStock):
+        db.place_order('Stock', [{'coffee_type_id': tracked, 'quantity': 1}])
+    shown = [item['id'] for items in db.get_coffee_types_by_category().values() for item in items]
+    assert tracked not in shown
+
+def test_place_order_releases_stock_when_the_order_fails(tracked):
+    with pytest.raises(ValueError):
+        db.place_order('Stock', [{'coffee_type_id': tracked, 'quantity': 2},
+                                 {'coffee_type_id': 999999, 'quantity': 1}])
+    assert db.get_stock(tracked) == 3
+
+def test_place_order_releases_stock_on_a_replay(tracked):
+    first = db.place_order('Stock', [{'coffee_type_id': tracked, 'quantity': 1}], 'stock-key')
+    second = db.place_order('Stock', [{'coffee_type_id': tracked, 'quantity': 1}], 'stock-key')
+    assert first == second
+    assert db.get_stock(tracked) == 2
+
+def test_place_order_rejects_quantities_below_one(tracked):
+    with pytest.raises(ValueError):
+        db.place_order('Stock', [{'coffee_type_id': tracked, 'quantity': -10}])
+    assert db.get_stock(tracked) == 3
+
+def test_add_to_cart_rejects_quantities_below_one(client, tracked):
+    response = client.post('/add_to_cart', data={'coffee_type_id': tracked, 'quantity': -10})
+    assert response.status_code == 400
+
+def test_api_menu_last_modified_moves_when_an_item_sells_out(client, tracked):
+    before = client.get('/api/menu')
+    time.sleep(1.1)  # Last-Modified has one-second resolution
+    db.place_order('Stock', [{'coffee_type_id': tracked, 'quantity': 3}])
+    after = client.get('/api/menu', headers={'If-Modified-Since': before.headers['Last-Modified']})
+    assert after.status_code == 200
+    assert after.headers['ETag'] != before.headers['ETag']
@@ -0,0 +1,48 @@
+import re
+
+import database as db
+from order_feed import OrderFeed, get_feed
+
+def catch_up(feed, last_id):
+    """The first chunk a screen reconnecting with Last-Event-ID gets"""
+    chunks = feed.stream(last_id)
+    assert next(chunks).startswith('retry:')
+    return next(chunks)
+
+def event_ids(chunk):
+    return [int(event_id) for event_id in re.findall(r'^id: (\d+)$', chunk, re.M)]
+
+def test_event_ids_are_outbox_ids(app):
+    before = db.get_last_event_id()
+    coffee = db.get_coffee_types()[0]
+    order_id = db.place_order('Feed Test', [{'coffee_type_id': coffee['id'], 'quantity': 1}])
+    db.advance_order(order_id, 'accept')
+    conn = db.get_db_connection()
+    outbox = [row['id'] for row in conn.execute('SELECT id FROM order_events WHERE id > ? ORDER BY id', (before,))]
+    conn.close()
+    assert len(outbox) == 2
+    chunk = catch_up(get_feed(), before)
+    assert event_ids(chunk) == outbox
+    assert 'event: order' in chunk and 'event: status' in chunk
+
+def test_resume_from_another_worker(app):
+    coffee = db.get_coffee_types()[0]
+    db.place_order('Feed Test', [{'coffee_type_id': coffee['id'], 'quantity': 1}])
+    base = db.get_last_event_id()
+    feed = OrderFeed()
+    feed.publish(base + 1, 'status', {'id': 1, 'status': 'accepted'})
+    feed.publish(base + 3, 'status', {'id': 3, 'status': 'accepted'})
+    # Written before base + 3 by another worker, relayed here after it
+    feed.publish(base + 2, 'status', {'id': 2, 'status': 'accepted'})
+
+    # The screen saw up to base + 2 on the other worker: no reset, no repeats
+    chunk = catch_up(feed, base + 2)
+    assert 'event: reset' not in chunk
+    assert '"id":3' in chunk and '"id":2' not in chunk and '"id":1' not in chunk
+    assert event_ids(chunk) == [base + 3]
+
+def test_resume_from_before_history_resets(app):
+    coffee = db.get_coffee_types()[0]
+    db.place_order('Feed Test', [{'coffee_type_id': coffee['id'], 'quantity': 1}])
+    feed = OrderFeed()
+    assert catch_up(feed, 0).startswith('event: reset')
@@ -0,0 +1,54 @@
+import pytest
+
+import database as db
+
+@pytest.fixture(scope='module')
+def orders(app):
+    coffee = db.get_coffee_types()[0]
+    for n in range(db.MAX_ORDERS_PAGE_SIZE + 5):
+        db.place_order(f'Pager {n}', [{'coffee_type_id': coffee['id'], 'quantity': 2}])
+    conn = db.get_db_connection()
+    ids = [row['id'] for row in conn.execute('SELECT id FROM orders ORDER BY order_date DESC, id DESC')]
+    conn.close()
+    return ids, coffee
+
+def walk(page_size):
+    pages = []
+    before = None
+    while True:
+        page, before = db.get_orders_page(before, page_size)
+        pages.append([order['id'] for order in page])
+        if before is None:
+            return pages
+
+def test_pages_cover_every_order_once(orders):
+    ids, coffee = orders
+    pages = walk(7)
+    assert [order_id for page in pages for order_id in page] == ids
+    assert all(len(page) == 7 for page in pages[:-1])
+    assert 1 <= len(pages[-1]) <= 7
+
+def test_first_page_describes_items(orders):
+    ids, coffee = orders
+    page, cursor = db.get_orders_page(None, 1)
+    assert page[0]['id'] == ids[0]
+    assert page[0]['items_description'] == f"{coffee['name']} (x2)"
+    assert page[0]['item_count'] == 1
+    assert cursor == (page[0]['order_date'], page[0]['id'])
+
+def test_last_page_has_no_cursor(orders):
+    ids, coffee = orders
+    last = db.get_order_details(ids[-4])['order']
+    page, cursor = db.get_orders_page((last['order_date'], last['id']), 10)
+    assert [order['id'] for order in page] == ids[-3:]
+    assert cursor is None
+
+def test_page_size_is_clamped(orders, client):
+    page, cursor = db.get_orders_page(None, db.MAX_ORDERS_PAGE_SIZE * 10)
+    assert len(page) == db.MAX_ORDERS_PAGE_SIZE
+    assert cursor is not None
+    assert len(db.get_orders_page(None, 0)[0]) == 1
+
+    response = client.get(f'/orders?per_page={db.MAX_ORDERS_PAGE_SIZE * 10}')
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).count('Pager ') == db.MAX_ORDERS_PAGE_SIZE
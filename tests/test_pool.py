@@ -0,0 +1,60 @@
+import threading
+from urllib.request import urlopen
+
+from werkzeug.serving import make_server
+
+import database as db
+
+def test_connections_are_shared_between_threads(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / 'pool.db'))
+    seen = []
+
+    def request():
+        seen.append(pool.acquire())
+        assert pool.acquire() is seen[-1]  # same one for the rest of the request
+        pool.release()
+
+    for _ in range(5):
+        thread = threading.Thread(target=request)
+        thread.start()
+        thread.join()
+    assert len(set(map(id, seen))) == 1
+    assert pool.stats()['misses'] == 1
+    assert pool.stats()['hits'] == 4
+    pool.close_all()
+
+def test_idle_connections_are_bounded(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / 'pool.db'), size=2)
+    barrier = threading.Barrier(5)
+
+    def request():
+        pool.acquire()
+        barrier.wait()
+        pool.release()
+
+    threads = [threading.Thread(target=request) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.stats()['idle_connections'] == 2
+    assert pool.stats()['recycled'] == 3
+    pool.close_all()
+
+def test_threaded_server_reuses_connections(app):
+    # werkzeug starts a thread per request; the pool must outlive them
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/orders'
+    try:
+        urlopen(url).read()
+        before = db.get_pool_stats()
+        for _ in range(20):
+            urlopen(url).read()
+        after = db.get_pool_stats()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert after['misses'] == before['misses']
+    assert after['hits'] - before['hits'] == 20
+    assert after['open_connections'] == before['open_connections']
@@ -0,0 +1,57 @@
+from click.testing import CliRunner
+
+import database as db
+import remove_order
+
+def place(customer_name, count, key=None):
+    coffee = db.get_coffee_types()[1]
+    return [db.place_order(customer_name, [{'coffee_type_id': coffee['id'], 'quantity': 2}],
+                           key and f'{key}-{n}')
+            for n in range(count)]
+
+def count_rows(table, column, ids):
+    conn = db.get_db_connection()
+    count = conn.execute(f'SELECT COUNT(*) FROM {table} WHERE {column} IN ({", ".join("?" * len(ids))})',
+                         ids).fetchone()[0]
+    conn.close()
+    return count
+
+def test_delete_orders_in_chunks(app):
+    ids = place('Purge Chunks', 5, key='purge-chunks')
+    assert count_rows('order_items', 'order_id', ids) == 5
+    assert count_rows('idempotency_keys', 'order_id', ids) == 5
+
+    chunks = list(db.delete_orders('customer_name = ?', ('Purge Chunks',), chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert sorted(order_id for chunk in chunks for order_id in chunk) == ids
+    assert count_rows('orders', 'id', ids) == 0
+    assert count_rows('order_items', 'order_id', ids) == 0
+    assert count_rows('idempotency_keys', 'order_id', ids) == 0
+
+def test_delete_orders_leaves_archived_orders(app):
+    [archived] = place('Purge Archived', 1)
+    conn = db.get_db_connection()
+    conn.execute("UPDATE orders SET order_date = '2021-04-01 09:00:00', status = 'collected' WHERE id = ?",
+                 (archived,))
+    conn.commit()
+    conn.close()
+    db.rebuild_sales_rollups()
+    assert db.archive_orders(older_than_days=90) == {'2021-04': 1}
+    [live] = place('Purge Archived', 1)
+
+    assert list(db.delete_orders('customer_name = ?', ('Purge Archived',))) == [[live]]
+    assert db.get_order_details(live) is None
+    assert db.get_order_details(archived)['order']['customer_name'] == 'Purge Archived'
+
+def test_cli_dry_run_deletes_nothing(app):
+    ids = place('Purge Dry', 2)
+    result = CliRunner().invoke(remove_order.cli, ['customer', 'Purge Dry', '--dry-run'])
+    assert result.exit_code == 0, result.output
+    total = sum(db.get_order_details(order_id)['order']['total_amount'] for order_id in ids)
+    assert result.output == f"2 order(s) with 2 item(s), ${total:.2f} in total\nDry run: nothing deleted.\n"
+    assert count_rows('orders', 'id', ids) == 2
+
+    result = CliRunner().invoke(remove_order.cli, ['customer', 'Purge Dry', '--yes'])
+    assert result.exit_code == 0, result.output
+    assert result.output.endswith("Deleted 2 order(s)\n")
+    assert count_rows('orders', 'id', ids) == 0
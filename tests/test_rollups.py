@@ -0,0 +1,34 @@
+import database as db
+
+def rollups():
+    conn = db.get_db_connection()
+    tables = {
+        'sales_daily': [(row[0], row[1], row[2], round(row[3], 2))
+                        for row in conn.execute('SELECT day, orders, items, revenue FROM sales_daily ORDER BY 1')],
+        'sales_hourly': [(row[0], row[1], row[2], round(row[3], 2))
+                         for row in conn.execute('SELECT day, hour, orders, revenue FROM sales_hourly ORDER BY 1, 2')],
+        'item_daily': [(row[0], row[1], row[2], round(row[3], 2))
+                       for row in conn.execute('SELECT day, coffee_type_id, quantity, revenue FROM item_daily ORDER BY 1, 2')],
+    }
+    conn.close()
+    return tables
+
+def place(customer_name, count):
+    coffee_types = db.get_coffee_types()
+    for n in range(count):
+        db.place_order(customer_name, [{'coffee_type_id': coffee_types[n % 3]['id'], 'quantity': n + 1},
+                                       {'coffee_type_id': coffee_types[3]['id'], 'quantity': 1}])
+
+def test_deleted_orders_leave_the_rollups(app):
+    place('Rollup Keep', 2)
+    place('Rollup Customer', 3)
+    place('Rollup Purge', 5)
+    before = rollups()
+
+    assert db.remove_orders_by_customer('Rollup Customer') == 3
+    assert sum(len(ids) for ids in db.delete_orders('customer_name = ?', ('Rollup Purge',), chunk_size=2)) == 5
+    after = rollups()
+    assert after != before
+
+    db.rebuild_sales_rollups()
+    assert rollups() == after
@@ -0,0 +1,16 @@
+import database as db
+
+def test_search(app):
+    coffee = db.get_coffee_types()[0]
+    order_id = db.place_order('Bartholomew', [{'coffee_type_id': coffee['id'], 'quantity': 1}])
+
+    orders, corrected = db.search_orders('bartholomew')
+    assert [order['id'] for order in orders] == [order_id]
+    assert corrected is None
+
+    orders, corrected = db.search_orders('bartholmew')
+    assert [order['id'] for order in orders] == [order_id]
+    assert corrected == 'bartholomew'
+
+    # Nothing indexed is spelled anything like it
+    assert db.search_orders('bxqzzv') == ([], None)
@@ -0,0 +1,14 @@
+import json
+
+import database as db
+import server
+
+def test_heartbeat_reports_pool_stats(app, tmp_path):
+    worker = server.Worker(app, '127.0.0.1', 0, None, 0, 0, str(tmp_path))
+    worker._heartbeat()
+    [path] = tmp_path.iterdir()
+    with open(path) as f:
+        status = json.load(f)
+    assert status['pid'] and status['requests'] == 0
+    assert list(status['pools']) == ['']
+    assert status['pools']['']['hits'] == db.get_pool_stats()['hits']
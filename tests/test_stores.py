@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TESTS)
+
+def check_routing():
+    """Runs in a child process: COFFEE_STORES is read when database is imported"""
+    import app as coffee
+
+    client = coffee.app.test_client()
+    categories = client.get('/store/downtown/api/menu').get_json()['categories']
+    coffee_type_id = next(iter(categories.values()))[0]['id']
+    assert client.post('/store/downtown/api/cart', json={'coffee_type_id': coffee_type_id, 'quantity': 2}).status_code == 200
+    response = client.post('/store/downtown/api/checkout', json={'customer_name': 'Downtown Regular'})
+    assert response.status_code == 201, response.get_data(as_text=True)
+    order_id = response.get_json()['order']['id']
+
+    def open_orders(base, prefix=''):
+        response = client.get(prefix + '/api/orders/open', base_url=base)
+        assert response.status_code == 200
+        return [order['customer_name'] for order in response.get_json()['orders']]
+
+    assert open_orders('http://localhost', '/store/downtown') == ['Downtown Regular']
+    assert open_orders('http://localhost', '/store/airport') == []
+    # Subdomains pick the store too
+    assert open_orders('http://downtown.coffee.test') == ['Downtown Regular']
+    assert open_orders('http://airport.coffee.test') == []
+    assert 'Downtown Regular' in client.get('/store/downtown/orders').get_data(as_text=True)
+    assert 'Downtown Regular' not in client.get('/store/airport/orders').get_data(as_text=True)
+    # The other store has no such order to advance
+    assert client.post(f'/store/airport/api/orders/{order_id}/accept').status_code == 404
+    assert client.post(f'/store/downtown/api/orders/{order_id}/accept').get_json()['status'] == 'accepted'
+
+    for path, base in [('/store/uptown/orders', 'http://localhost'),
+                       ('/orders', 'http://uptown.coffee.test'),
+                       ('/orders', 'http://localhost')]:  # no COFFEE_STORE default
+        response = client.get(path, base_url=base)
+        assert response.status_code == 404
+        assert response.get_data(as_text=True) == 'Unknown store'
+
+def test_store_routing(tmp_path):
+    env = dict(os.environ, COFFEE_STORES='downtown,airport', COFFEE_STORE_DIR=str(tmp_path / 'stores'),
+               COFFEE_STORE_DOMAIN='coffee.test', COFFEE_ARCHIVE_DIR=str(tmp_path / 'archive'),
+               PYTHONPATH=os.pathsep.join([ROOT, TESTS]))
+    env.pop('COFFEE_STORE', None)
+    result = subprocess.run([sys.executable, '-c', 'import test_stores; test_stores.check_routing()'],
+                            cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
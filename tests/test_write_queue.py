@@ -0,0 +1,91 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database as db
+
+@pytest.fixture
+def writer(tmp_path):
+    path = str(tmp_path / 'writes.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE t (n INTEGER UNIQUE)')
+    conn.close()
+    queue = db.WriteQueue(db.ConnectionPool(path))
+    yield queue, path
+    queue.stop()
+
+def rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(n for (n,) in conn.execute('SELECT n FROM t'))
+    finally:
+        conn.close()
+
+def insert(conn, n):
+    conn.execute('INSERT INTO t (n) VALUES (?)', (n,))
+    return n
+
+def test_run_returns_result_and_raises_job_errors(writer):
+    queue, path = writer
+    assert queue.run(insert, 1) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        queue.run(insert, 1)
+    assert rows(path) == [1]
+
+def test_jobs_queued_during_a_commit_share_the_next_one(writer):
+    queue, path = writer
+    started, release = threading.Event(), threading.Event()
+
+    def block(conn):
+        started.set()
+        release.wait(5)
+
+    first = queue.submit(block)
+    assert started.wait(5)
+    futures = [queue.submit(insert, n) for n in range(10)]
+    release.set()
+    first.result(5)
+    assert [f.result(5) for f in futures] == list(range(10))
+
+    stats = queue.stats()
+    assert stats['batches'] == 2
+    assert stats['largest_batch'] == 10
+
+def test_failing_job_rolls_back_alone(writer):
+    queue, path = writer
+    started, release = threading.Event(), threading.Event()
+
+    def block(conn):
+        started.set()
+        release.wait(5)
+
+    def insert_then_fail(conn):
+        conn.execute('INSERT INTO t (n) VALUES (99)')
+        raise RuntimeError('boom')
+
+    queue.submit(block)
+    assert started.wait(5)
+    before = queue.submit(insert, 1)
+    failing = queue.submit(insert_then_fail)
+    after = queue.submit(insert, 2)
+    release.set()
+
+    assert before.result(5) == 1
+    assert after.result(5) == 2
+    with pytest.raises(RuntimeError):
+        failing.result(5)
+    # Its savepoint was rolled back; its batch-mates were committed
+    assert rows(path) == [1, 2]
+    assert queue.stats()['batches'] == 2
+
+def test_concurrent_submitters_all_commit(writer):
+    queue, path = writer
+    threads = [threading.Thread(target=lambda start=start: [queue.run(insert, n) for n in range(start, start + 25)])
+               for start in range(0, 200, 25)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert rows(path) == list(range(200))
+    assert queue.stats()['jobs'] == 200